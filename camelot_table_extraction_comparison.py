@@ -1,11 +1,25 @@
 """
 Parser comparison script for local use.
 This script lets you visualize side-by-side how each parser analyzes a document, and compare the resulting tables.
+--benchmark runs the pages x flavors matrix headless instead (repeated runs, tables, shapes, parsing report
+accuracy/whitespace, peak RSS), writes JSON + CSV and with --baseline flags regressions against an earlier run.
+--workers N runs the (page, flavor) grid on a process pool over single-page temp files.
+--route probes each page's ruling lines and text columns with pymupdf and runs only the likely flavor.
+--report DIR writes a static HTML report page by page (small PNG table grids) instead of the matplotlib windows.
+--cache keeps each page's tables per flavor in the page_cache SQLite file, so re-runs skip camelot.
 """
 
 # Bootstrap and common imports
 import sys, os, time, textwrap
+import argparse, csv, ctypes, hashlib, html, json, multiprocessing, statistics, tempfile
+from concurrent.futures import ProcessPoolExecutor
+from types import SimpleNamespace
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
 import numpy as np
+import pandas as pd
 import matplotlib.pyplot as plt
 from matplotlib.patches import Rectangle
 
@@ -28,6 +42,9 @@ sys.path.insert(
     0, os.path.abspath("")
 )  # Prefer the local version of camelot if available
 import camelot
+import pymupdf as p
+from chapter_manifest import load_manifest, find_chapter
+from page_cache import DEFAULT_CACHE_PATH, PageCache, file_hash
 
 print(f"Using camelot v{camelot.__version__}.")
 
@@ -54,7 +71,21 @@ def parse_page_string(pages_str):
             pages.append(int(part))
     return [str(p) for p in pages]
 
-page_list = parse_page_string(PAGES_TO_PARSE)
+# Optionally read a virtual chapter from a splitter manifest instead of a chapter PDF:
+# FILENAME becomes the master PDF and PAGES_TO_PARSE stays relative to the chapter
+MANIFEST = None  # e.g. r"C:\Users\E40065689\Desktop\pdf_parse\at90can128_rm.pdf_chapters\chapters.manifest.json"
+CHAPTER = "4__Memories"
+
+def resolve_pages(filename, pages_str):
+    """(pdf to parse, page list), mapped onto the master PDF when MANIFEST is set"""
+    page_list = parse_page_string(pages_str)
+    if MANIFEST:
+        manifest = load_manifest(MANIFEST)
+        chapter = find_chapter(manifest, CHAPTER)
+        filename = manifest["source"]
+        page_list = [str(int(page) + chapter["start"]) for page in page_list]
+        print(f"Chapter {chapter['title']}: parsing master pages {', '.join(page_list)} of {filename}")
+    return filename, page_list
 
 FLAVORS = ["stream", "lattice", "network", "hybrid"]
 FLAVORS = ["lattice"]
@@ -102,7 +133,8 @@ def plot_parsing_report_as_image(parsing_report, ax, title="Parsing Report"):
 def plot_page(page_num, parses, max_tables):
     """Plot a single page with table detection and parsing reports."""
     # New layout: tables in a grid, parsing report as a wide text area at the bottom
-    n_flavors = len(FLAVORS)
+    flavors = list(parses)  # only the flavors that ran on this page (routing may skip some)
+    n_flavors = len(flavors)
     n_tables = max(max_tables, 1)
     table_rows = n_tables
     table_cols = n_flavors
@@ -142,14 +174,17 @@ def plot_page(page_num, parses, max_tables):
         report_axes.append(ax)
 
     # Plot tables
-    for flavor_idx, flavor in enumerate(FLAVORS):
+    for flavor_idx, flavor in enumerate(flavors):
         parse = parses[flavor]
         tables = parse["tables"]
         for table_idx in range(table_rows):
             ax = table_axes[table_idx][flavor_idx]
             if table_idx < len(tables):
                 table = tables[table_idx]
-                if table.shape[0] > 0 and table.shape[1] > 0:
+                if isinstance(table, CachedTable):
+                    ax.text(0.5, 0.5, "Cached table (no grid)", ha='center', va='center', transform=ax.transAxes, fontsize=16)
+                    ax.set_title(f"{flavor} Table {table_idx}\n{table.shape[0]}x{table.shape[1]}", fontsize=16, fontweight="bold")
+                elif table.shape[0] > 0 and table.shape[1] > 0:
                     camelot.plot(table, kind="grid", ax=ax)
                     ax.set_title(f"{flavor} Table {table_idx}\n{table.shape[0]}x{table.shape[1]}", fontsize=16, fontweight="bold")
                     for line in ax.lines:
@@ -162,7 +197,7 @@ def plot_page(page_num, parses, max_tables):
                 ax.axis('off')
 
     # Plot parsing reports at the bottom, one per flavor, covering all tables
-    for flavor_idx, flavor in enumerate(FLAVORS):
+    for flavor_idx, flavor in enumerate(flavors):
         parse = parses[flavor]
         # Combine all parsing reports for this flavor into one text
         report_text = ""
@@ -232,72 +267,569 @@ def create_window_with_pages(pages_data, window_num):
 
     return window_fig
 
-pages_data = []  # Store all page data here
-
-for page in page_list:
-    print(f"\n=== Processing page {page} ===")
-    tables_parsed = {}
-    parses = {}
-    max_tables = 0
-    
-    for flavor_idx, flavor in enumerate(FLAVORS):
-        timer_before_parse = time.perf_counter()
-        error, tables = None, []
-        try:
-            tables = camelot.read_pdf(FILENAME, flavor=flavor, debug=True, 
-                                    pages=page, **KWARGS)
-        except ValueError as value_error:
-            error = f"Invalid argument for parser {flavor}: {value_error}"
-            print(error)
-        timer_after_parse = time.perf_counter()
-        max_tables = max(max_tables, len(tables))
-
-        parses[flavor] = {
-            "tables": tables,
-            "time": timer_after_parse - timer_before_parse,
-            "error": error,
-        }
-
-        print(f"##### {flavor} ####")
+# Table deduplication across flavors: tables with the same fingerprint are reported as "Same as ...".
+# Fuzzy mode also treats tables as the same when they only differ in whitespace, in empty rows, or in
+# merged-cell text that camelot copied into the spanned cells (copy_text=['h'] / ['v']).
+FUZZY_DEDUP = False
+
+def table_fingerprint(table, fuzzy=False):
+    """Exact: shape + hash of the cell texts. Fuzzy: column count + hash of the non-empty rows with
+    whitespace removed and spill blanked: a cell camelot marks as spanned (hspan / vspan) that repeats
+    its left / upper neighbour holds copied text. Unspanned repeats (e.g. R/W in consecutive rows) count."""
+    rows = table.df.astype(str).values.tolist()
+    if not fuzzy:
+        cells = "\x1e".join("\x1f".join(row) for row in rows)
+        return table.shape, hashlib.sha1(cells.encode("utf-8")).hexdigest()
+    norm_rows, above = [], None
+    for row, spans in zip(rows, table.cells):
+        cells = ["".join(cell.split()) for cell in row]
+        kept = ["" if (i > 0 and span.hspan and cell == cells[i - 1])
+                or (above is not None and span.vspan and cell == above[i]) else cell
+                for i, (cell, span) in enumerate(zip(cells, spans))]
+        above = cells
+        if any(kept):
+            norm_rows.append("\x1f".join(kept))
+    return table.shape[1], hashlib.sha1("\x1e".join(norm_rows).encode("utf-8")).hexdigest()
+
+def print_page_tables(parses, fuzzy=None):
+    """Print each flavor's tables, pointing out tables identical to an earlier flavor's."""
+    fuzzy = FUZZY_DEDUP if fuzzy is None else fuzzy
+    seen = {}  # fingerprint -> ["flavor table idx", ...] of earlier flavors
+    for flavor, parse in parses.items():
+        tables = parse["tables"]
+        if parse["error"]:
+            print(parse["error"])
+        print(f"##### {flavor} ####" + (" (cached)" if parse.get("cached") else ""))
         print(f"Found {len(tables)} table(s):")
+        fingerprints = [table_fingerprint(table, fuzzy) for table in tables]
         for table_idx, table in enumerate(tables):
-            flavors_matching = []
-            
-            for previous_flavor, previous_tables in tables_parsed.items():
-                for prev_idx, previous_table in enumerate(previous_tables):
-                    if previous_table.df.equals(table.df):
-                        flavors_matching.append(f"{previous_flavor} table {prev_idx}")
+            flavors_matching = seen.get(fingerprints[table_idx], [])
             print(f"## Table {table_idx} ##")
             print("Parsing report: ", table.parsing_report)
             if flavors_matching:
                 print(f"Same as {', '.join(flavors_matching)}.")
             else:
                 print(table.df)
-        tables_parsed[flavor] = tables
-
-    # Store page data instead of creating figure immediately
-    pages_data.append({
+        for table_idx, fingerprint in enumerate(fingerprints):
+            seen.setdefault(fingerprint, []).append(f"{flavor} table {table_idx}")
+
+
+# Camelot result cache (--cache): each page's tables per flavor are stored in a page_cache.PageCache as
+# cell text, parsing report and cell spans, keyed by the original PDF (not the single-page temp files),
+# the flavor and KWARGS. Cached tables print and deduplicate like camelot's but have no debug data, so
+# their grids are not plotted. The benchmark always runs camelot, since it measures the parse itself.
+CAMELOT_EXTRACTOR = "camelot.tables"
+
+class CachedTable:
+    """Stand-in for a camelot Table read back from the cache: df, shape, parsing_report, page and
+    cells (hspan/vspan only)"""
+    def __init__(self, record, page):
+        self.df = pd.DataFrame(record["rows"])
+        self.shape = self.df.shape
+        self.parsing_report = record["parsing_report"]
+        self.page = page
+        self.cells = [[SimpleNamespace(hspan=hspan, vspan=vspan) for hspan, vspan in row] for row in record["spans"]]
+
+def table_record(table):
+    report = {key: value.item() if isinstance(value, np.generic) else value
+              for key, value in table.parsing_report.items()}
+    return {"rows": table.df.astype(str).values.tolist(), "parsing_report": report,
+            "spans": [[[bool(cell.hspan), bool(cell.vspan)] for cell in row] for row in table.cells]}
+
+def cache_options(flavor):
+    return {"flavor": flavor, "kwargs": KWARGS, "camelot": camelot.__version__}
+
+def parse_flavor(filename, flavor, page, camelot_page="1", cache_at=None):
+    """One camelot run with debug data for plotting: {"tables", "time", "error", "cached"}.
+    camelot_page is the page within `filename`; `page` (the page of the original PDF) is written
+    back to each table so single-page temp files report the right page.
+    cache_at: (page cache path, file_hash of the original PDF) to reuse and store the tables"""
+    timer_before_parse = time.perf_counter()
+    if cache_at is not None:
+        cache_path, doc_hash = cache_at
+        with PageCache(cache_path) as cache:
+            records = cache.get(doc_hash, int(page) - 1, CAMELOT_EXTRACTOR, cache_options(flavor))
+        if records is not None:
+            return {
+                "tables": [CachedTable(record, page) for record in records],
+                "time": time.perf_counter() - timer_before_parse,
+                "error": None,
+                "cached": True,
+            }
+    error, tables = None, []
+    try:
+        tables = camelot.read_pdf(filename, flavor=flavor, debug=True,
+                                pages=camelot_page, **KWARGS)
+    except ValueError as value_error:
+        error = f"Invalid argument for parser {flavor}: {value_error}"
+    timer_after_parse = time.perf_counter()
+    for table in tables:
+        table.page = page
+    if cache_at is not None and error is None:
+        with PageCache(cache_path) as cache:
+            cache.put(doc_hash, int(page) - 1, CAMELOT_EXTRACTOR, [table_record(table) for table in tables],
+                      cache_options(flavor))
+    return {
+        "tables": tables,
+        "time": timer_after_parse - timer_before_parse,
+        "error": error,
+        "cached": False,
+    }
+
+
+# Per-page flavor routing: probe the page's vector graphics and word alignment with pymupdf (milliseconds)
+# and run only the flavor most likely to succeed. Ruled (boxed) tables go to lattice, unruled tables with
+# aligned text columns (register summaries) to network, the rest (prose, loose layouts) to stream. When the
+# routed flavor finds nothing, fails, or reports an accuracy below ROUTE_MIN_ACCURACY, the next flavor of
+# its fallback chain runs. Routing only ever picks among the selected FLAVORS (--flavors).
+ROUTE_MIN_H_LINES = 3
+ROUTE_MIN_V_LINES = 2
+ROUTE_MIN_RECTS = 3
+ROUTE_MIN_COLUMNS = 3     # x positions where cells start in at least ROUTE_MIN_ROWS rows
+ROUTE_MIN_ROWS = 3        # rows split into two or more cells by wide gaps
+ROUTE_MIN_ALIGNED = 0.6   # fraction of those rows' cell starts that line up with a column
+ROUTE_MIN_ACCURACY = 80.0
+ROUTE_FALLBACKS = {
+    "lattice": ["lattice", "hybrid", "network"],
+    "network": ["network", "hybrid", "stream"],
+    "stream": ["stream", "network"],
+}
+
+def text_columns(words, column_tolerance=2.0, row_tolerance=3.0):
+    """(cell rows, columns, aligned) of the page's words. Words are grouped into rows by their vertical
+    center; a word starts a cell when it follows a gap wider than the text height (wider than any word
+    space, even in justified prose). Rows with two or more cells are cell rows; a column is an x position
+    (within column_tolerance) where cells start in at least ROUTE_MIN_ROWS cell rows; aligned is the
+    fraction of the cell rows' cell starts that fall on a column."""
+    if not words:
+        return 0, 0, 0.0
+    words = sorted(words, key=lambda w: ((w[1] + w[3]) / 2, w[0]))
+    rows, row, row_y = [], [], None
+    for w in words:
+        y = (w[1] + w[3]) / 2
+        if row and abs(y - row_y) > row_tolerance:
+            rows.append(row)
+            row = []
+        if not row:
+            row_y = y
+        row.append(w)
+    rows.append(row)
+    starts, start_rows = [], []
+    for row_idx, row in enumerate(rows):
+        row.sort(key=lambda w: w[0])
+        cells = [row[0][0]] + [w[0] for prev, w in zip(row, row[1:]) if w[0] - prev[2] > (w[3] - w[1])]
+        if len(cells) >= 2:
+            starts.extend(cells)
+            start_rows.extend([row_idx] * len(cells))
+    cell_rows = len(set(start_rows))
+    if not cell_rows:
+        return 0, 0, 0.0
+    bins = np.round(np.array(starts) / column_tolerance).astype(int).tolist()
+    # Rows per column bin, counting a bin's neighbours too so starts 1 pt apart are not split
+    bin_rows = {}
+    for b, row_idx in zip(bins, start_rows):
+        for neighbour in (b - 1, b, b + 1):
+            bin_rows.setdefault(neighbour, set()).add(row_idx)
+    column_bins = sorted(b for b in set(bins) if len(bin_rows[b]) >= ROUTE_MIN_ROWS)
+    # Adjacent column bins are one column
+    columns = sum(1 for i, b in enumerate(column_bins) if i == 0 or b - column_bins[i - 1] > 1)
+    on_column = set(column_bins)
+    aligned = sum(any(b + d in on_column for d in (-1, 0, 1)) for b in bins) / len(starts)
+    return cell_rows, columns, float(aligned)
+
+def probe_page(page):
+    """Ruling lines, filled/stroked boxes and aligned text columns of a pymupdf page"""
+    h_lines = v_lines = rects = 0
+    for drawing in page.get_drawings():
+        for item in drawing["items"]:
+            if item[0] == "l":
+                p1, p2 = item[1], item[2]
+                if abs(p1.y - p2.y) < 1 and abs(p1.x - p2.x) > 5:
+                    h_lines += 1
+                elif abs(p1.x - p2.x) < 1 and abs(p1.y - p2.y) > 5:
+                    v_lines += 1
+            elif item[0] == "re":
+                rect = item[1]
+                # Thin rectangles are how many PDFs draw ruling lines
+                if rect.height < 2 and rect.width > 5:
+                    h_lines += 1
+                elif rect.width < 2 and rect.height > 5:
+                    v_lines += 1
+                elif rect.width > 5 and rect.height > 5:
+                    rects += 1
+    words = page.get_text("words")
+    cell_rows, columns, aligned = text_columns(words)
+    return {"h_lines": h_lines, "v_lines": v_lines, "rects": rects, "words": len(words),
+            "cell_rows": cell_rows, "columns": columns, "aligned": aligned}
+
+def route_flavor(probe):
+    ruled = probe["h_lines"] >= ROUTE_MIN_H_LINES and probe["v_lines"] >= ROUTE_MIN_V_LINES
+    if ruled or probe["rects"] >= ROUTE_MIN_RECTS:
+        return "lattice"
+    if (probe["cell_rows"] >= ROUTE_MIN_ROWS and probe["columns"] >= ROUTE_MIN_COLUMNS
+            and probe["aligned"] >= ROUTE_MIN_ALIGNED):
+        return "network"
+    return "stream"
+
+def route_chain(probe, flavors):
+    """Fallback chain of the routed flavor, restricted to the selected flavors (never empty)"""
+    chain = [flavor for flavor in ROUTE_FALLBACKS[route_flavor(probe)] if flavor in flavors]
+    return chain or list(flavors[:1])
+
+def poor_parse(parse):
+    if parse["error"] or not parse["tables"]:
+        return True
+    accuracy = statistics.mean(table.parsing_report["accuracy"] for table in parse["tables"])
+    return accuracy < ROUTE_MIN_ACCURACY
+
+def parse_page_routed(filename, page, camelot_page, probe, flavors, cache_at=None):
+    """Run the fallback chain of the routed flavor until one parses well: (flavors run in order) -> parses"""
+    parses = {}
+    for flavor in route_chain(probe, flavors):
+        parses[flavor] = parse_flavor(filename, flavor, page, camelot_page, cache_at)
+        if not poor_parse(parses[flavor]):
+            break
+    return parses
+
+def route_and_parse(filename, page, camelot_page, flavors, cache_at=None):
+    """Probe camelot_page (1-based) of filename and parse it with the routed flavor(s): (probe, parses)"""
+    with p.open(filename) as doc:
+        probe = probe_page(doc[int(camelot_page) - 1])
+    return probe, parse_page_routed(filename, page, camelot_page, probe, flavors, cache_at)
+
+def print_route(probe, parses):
+    print(f"Route: {' -> '.join(parses)} (ruling lines {probe['h_lines']}h/{probe['v_lines']}v,"
+          f" boxes {probe['rects']}, {probe['columns']} columns over {probe['cell_rows']} rows,"
+          f" {probe['aligned']:.0%} aligned)")
+
+
+def page_data(page, parses):
+    return {
         'page': page,
         'parses': parses,
-        'max_tables': max_tables
-    })
-
-# Create and display windows with page images and parsing reports
-
-total_windows = (len(pages_data) + PAGES_PER_WINDOW - 1) // PAGES_PER_WINDOW
-print(f"\n=== Total pages: {len(pages_data)}, Creating {total_windows} window(s) ===")
-
-window_figures = []
-for i in range(0, len(pages_data), PAGES_PER_WINDOW):
-    window_pages = pages_data[i:i + PAGES_PER_WINDOW]
-    window_num = (i // PAGES_PER_WINDOW) + 1
-    print(f"Creating Window {window_num} with pages {[p['page'] for p in window_pages]}")
-    window_fig = create_window_with_pages(window_pages, window_num)
-    window_figures.append(window_fig)
-
-print(f"\n=== Created {len(window_figures)} separate window(s) ===")
-print("All windows should now be visible with high-resolution page images and parsing reports.")
-
-plt.show(block=True)
+        'max_tables': max((len(parse["tables"]) for parse in parses.values()), default=0)
+    }
 
 
+def parse_page(filename, page, route=False, cache_at=None):
+    """Run every flavor (or only the routed ones) on one page, print the tables and return the page data
+    used for plotting."""
+    print(f"\n=== Processing page {page} ===")
+    if route:
+        probe, parses = route_and_parse(filename, page, page, FLAVORS, cache_at)
+        print_route(probe, parses)
+    else:
+        parses = {flavor: parse_flavor(filename, flavor, page, page, cache_at) for flavor in FLAVORS}
+    print_page_tables(parses)
+    return page_data(page, parses)
+
+
+def split_pages(filename, page_list, folder):
+    """Write each page of page_list (1-based strings) as a single-page PDF in folder: {page: path}"""
+    page_files = {}
+    with p.open(filename) as src:
+        for page in page_list:
+            page_doc = p.open()
+            page_doc.insert_pdf(src, from_page=int(page) - 1, to_page=int(page) - 1)
+            page_files[page] = os.path.join(folder, f"page-{page}.pdf")
+            page_doc.save(page_files[page])
+            page_doc.close()
+    return page_files
+
+
+def iter_pages_parallel(filename, page_list, workers, route=False, cache_at=None):
+    """Run the (page, flavor) grid on a process pool and yield the page data of each page, in order
+    (same as parse_page). The PDF is split into single-page files once, so no job re-opens or re-splits
+    the full document. Jobs are submitted at most `workers` pages ahead of the consumer, so finished
+    results do not pile up while earlier pages are printed or rendered.
+    route: one job per page that probes it and runs only the routed flavor(s), see parse_page_routed."""
+    with tempfile.TemporaryDirectory() as folder:
+        page_files = split_pages(filename, page_list, folder)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = {}
+            pages_to_submit = iter(page_list)
+
+            def submit_next():
+                page = next(pages_to_submit, None)
+                if page is None:
+                    return
+                if route:
+                    pending[page] = pool.submit(route_and_parse, page_files[page], page, "1", FLAVORS, cache_at)
+                else:
+                    for flavor in FLAVORS:
+                        pending[page, flavor] = pool.submit(parse_flavor, page_files[page], flavor, page, "1",
+                                                            cache_at)
+
+            for _ in range(max(workers, 1)):
+                submit_next()
+            for page in page_list:
+                if route:
+                    probe, parses = pending.pop(page).result()
+                else:
+                    probe, parses = None, {flavor: pending.pop((page, flavor)).result() for flavor in FLAVORS}
+                submit_next()
+                print(f"\n=== Processing page {page} ===")
+                if probe:
+                    print_route(probe, parses)
+                print_page_tables(parses)
+                yield page_data(page, parses)
+
+
+def parse_pages_parallel(filename, page_list, workers, route=False, cache_at=None):
+    return list(iter_pages_parallel(filename, page_list, workers, route, cache_at))
+
+
+def show_windows(pages_data):
+    """Create and display windows with page images and parsing reports."""
+    total_windows = (len(pages_data) + PAGES_PER_WINDOW - 1) // PAGES_PER_WINDOW
+    print(f"\n=== Total pages: {len(pages_data)}, Creating {total_windows} window(s) ===")
+
+    window_figures = []
+    for i in range(0, len(pages_data), PAGES_PER_WINDOW):
+        window_pages = pages_data[i:i + PAGES_PER_WINDOW]
+        window_num = (i // PAGES_PER_WINDOW) + 1
+        print(f"Creating Window {window_num} with pages {[p['page'] for p in window_pages]}")
+        window_fig = create_window_with_pages(window_pages, window_num)
+        window_figures.append(window_fig)
+
+    print(f"\n=== Created {len(window_figures)} separate window(s) ===")
+    print("All windows should now be visible with high-resolution page images and parsing reports.")
+
+    plt.show(block=True)
+
+
+# Static HTML report, streamed one page at a time: each page's table grids are rendered to small PNGs
+# (at most REPORT_FIGSIZE inches at REPORT_DPI), written with the page's reports and tables, and the
+# page is dropped before the next one is parsed. Memory does not grow with the number of pages.
+REPORT_DPI = 80
+REPORT_FIGSIZE = (6, 8)
+
+def render_table_png(table, path):
+    fig, ax = plt.subplots(figsize=REPORT_FIGSIZE, dpi=REPORT_DPI)
+    try:
+        camelot.plot(table, kind="grid", ax=ax)
+        ax.set_title(f"{table.shape[0]}x{table.shape[1]}", fontsize=9)
+        fig.savefig(path, dpi=REPORT_DPI)
+    finally:
+        plt.close(fig)
+
+def page_report_html(data, report_dir):
+    page = data["page"]
+    parts = [f"<section><h2>Page {page}</h2>"]
+    for flavor, parse in data["parses"].items():
+        parts.append(f"<h3>{html.escape(flavor)}: {len(parse['tables'])} table(s) in {parse['time']:.2f}s</h3>")
+        if parse["error"]:
+            parts.append(f"<p class='error'>{html.escape(parse['error'])}</p>")
+        for table_idx, table in enumerate(parse["tables"]):
+            parts.append("<div class='table'>")
+            if table.shape[0] > 0 and table.shape[1] > 0 and not isinstance(table, CachedTable):
+                image = f"page-{page}-{flavor}-{table_idx}.png"
+                render_table_png(table, os.path.join(report_dir, image))
+                parts.append(f"<img src='{image}' loading='lazy' alt='{flavor} table {table_idx}'>")
+            parts.append(f"<pre>Table {table_idx}: {html.escape(str(table.parsing_report))}</pre>")
+            parts.append(table.df.to_html(index=False, header=False))
+            parts.append("</div>")
+    parts.append("</section>\n")
+    return "\n".join(parts)
+
+def write_html_report(pages, report_dir, title):
+    """Write report_dir/index.html from an iterable of page data (parse_page / iter_pages_parallel)"""
+    os.makedirs(report_dir, exist_ok=True)
+    index_path = os.path.join(report_dir, "index.html")
+    with open(index_path, "w", encoding="utf-8") as f:
+        f.write(f"<!DOCTYPE html><html><head><meta charset='utf-8'><title>{html.escape(title)}</title>"
+                "<style>body{font-family:sans-serif} .table{display:inline-block;vertical-align:top;margin:6px}"
+                " table{border-collapse:collapse;font-size:11px} td{border:1px solid #ccc;padding:2px}"
+                " .error{color:#b00}</style></head><body>\n"
+                f"<h1>{html.escape(title)}</h1>\n")
+        for data in pages:
+            f.write(page_report_html(data, report_dir))
+            f.flush()
+        f.write("</body></html>\n")
+    print(f"Report written to {index_path}")
+
+
+# Headless benchmark: pages x flavors, no plotting
+
+BENCHMARK_FIELDS = ["page", "flavor", "runs", "time_min", "time_median", "time_max", "tables", "shapes",
+                    "accuracy", "whitespace", "peak_rss_mb", "parse_rss_mb", "error"]
+
+def read_tables(filename, page, flavor):
+    """(tables, error) of one camelot run"""
+    try:
+        return camelot.read_pdf(filename, flavor=flavor, pages=page, **KWARGS), None
+    except ValueError as value_error:
+        return [], f"Invalid argument for parser {flavor}: {value_error}"
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB"""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+    class ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [("cb", ctypes.c_ulong), ("PageFaultCount", ctypes.c_ulong)] + [
+            (name, ctypes.c_size_t) for name in (
+                "PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage", "QuotaPagedPoolUsage",
+                "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage")]
+
+    counters = ProcessMemoryCounters()
+    counters.cb = ctypes.sizeof(counters)
+    ctypes.windll.psapi.GetProcessMemoryInfo(ctypes.windll.kernel32.GetCurrentProcess(),
+                                             ctypes.byref(counters), counters.cb)
+    return counters.PeakWorkingSetSize / (1024 * 1024)
+
+def rss_run(filename, page, flavor):
+    """(peak RSS before, peak RSS after) one camelot run, in MB; meant for a fresh child process"""
+    before = peak_rss_mb()
+    read_tables(filename, page, flavor)
+    return before, peak_rss_mb()
+
+def benchmark_cell(filename, page, flavor, repeat):
+    """Time `repeat` runs of one flavor on one page. Memory is measured in one extra run in a freshly
+    spawned process, so page rendering and OpenCV buffers count and earlier cells do not raise the peak:
+    peak_rss_mb is that process's peak RSS, parse_rss_mb what the parse added to it."""
+    if repeat < 1:
+        raise ValueError("repeat must be at least 1")
+    times = []
+    for _ in range(repeat):
+        before = time.perf_counter()
+        tables, error = read_tables(filename, page, flavor)
+        times.append(time.perf_counter() - before)
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        rss_before, rss_peak = pool.submit(rss_run, filename, page, flavor).result()
+    reports = [table.parsing_report for table in tables]
+    return {
+        "page": page,
+        "flavor": flavor,
+        "runs": repeat,
+        "time_min": min(times),
+        "time_median": statistics.median(times),
+        "time_max": max(times),
+        "tables": len(tables),
+        "shapes": ";".join(f"{table.shape[0]}x{table.shape[1]}" for table in tables),
+        "accuracy": statistics.mean(r["accuracy"] for r in reports) if reports else None,
+        "whitespace": statistics.mean(r["whitespace"] for r in reports) if reports else None,
+        "peak_rss_mb": rss_peak,
+        "parse_rss_mb": rss_peak - rss_before,
+        "error": error,
+    }
+
+def run_benchmark(filename, page_list, flavors, repeat=3):
+    results = []
+    for page in page_list:
+        for flavor in flavors:
+            result = benchmark_cell(filename, page, flavor, repeat)
+            print(f"page {page:>4} {flavor:<8} {result['time_median']:.3f}s  tables={result['tables']}"
+                  f"  shapes={result['shapes'] or '-'}  peak={result['peak_rss_mb']:.1f}MB"
+                  f" (+{result['parse_rss_mb']:.1f}MB)"
+                  + (f"  {result['error']}" if result["error"] else ""))
+            results.append(result)
+    return results
+
+def write_benchmark(results, json_path, filename, repeat):
+    benchmark = {
+        "camelot": camelot.__version__,
+        "file": filename,
+        "file_hash": file_hash(filename),
+        "repeat": repeat,
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "results": results,
+    }
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(benchmark, f, indent=1)
+    csv_path = os.path.splitext(json_path)[0] + ".csv"
+    with open(csv_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=BENCHMARK_FIELDS)
+        writer.writeheader()
+        writer.writerows(results)
+    print(f"Benchmark written to {json_path} and {csv_path}")
+
+def compare_benchmark(results, baseline_path, filename, repeat, time_tolerance=0.25, min_time_delta=0.05,
+                      accuracy_drop=1.0):
+    """Regression messages against a saved benchmark JSON, matched by (page, flavor):
+    median time more than time_tolerance (fraction) and min_time_delta seconds slower, a different table
+    count or shapes, or mean accuracy lower by more than accuracy_drop points.
+    Raises ValueError when the baseline was run on other PDF content or with another repeat count."""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        benchmark = json.load(f)
+    if benchmark.get("file_hash") != file_hash(filename):
+        raise ValueError(f"baseline {baseline_path} was not run on the content of {filename}")
+    if benchmark["repeat"] != repeat:
+        raise ValueError(f"baseline {baseline_path} used --repeat {benchmark['repeat']}, not {repeat}")
+    baseline = {(r["page"], r["flavor"]): r for r in benchmark["results"]}
+    regressions = []
+    for result in results:
+        base = baseline.get((result["page"], result["flavor"]))
+        if base is None:
+            continue
+        name = f"page {result['page']} {result['flavor']}"
+        slower = result["time_median"] - base["time_median"]
+        if slower > min_time_delta and result["time_median"] > base["time_median"] * (1 + time_tolerance):
+            regressions.append(f"{name}: {base['time_median']:.3f}s -> {result['time_median']:.3f}s")
+        if (result["tables"], result["shapes"]) != (base["tables"], base["shapes"]):
+            regressions.append(f"{name}: tables {base['tables']} ({base['shapes'] or '-'})"
+                               f" -> {result['tables']} ({result['shapes'] or '-'})")
+        if (result["accuracy"] is not None and base["accuracy"] is not None
+                and result["accuracy"] < base["accuracy"] - accuracy_drop):
+            regressions.append(f"{name}: accuracy {base['accuracy']:.1f} -> {result['accuracy']:.1f}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare camelot flavors on PDF pages")
+    parser.add_argument("--file", default=FILENAME)
+    parser.add_argument("--pages", default=PAGES_TO_PARSE, help='e.g. "1", "1,2,5", "1-3,5"')
+    parser.add_argument("--flavors", default=",".join(FLAVORS), help="comma separated camelot flavors")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes for the (page, flavor) grid; pages are split into temp files once")
+    parser.add_argument("--route", action="store_true",
+                        help="probe each page with pymupdf and run only the one of --flavors likely to work (with fallback)")
+    parser.add_argument("--fuzzy-dedup", action="store_true",
+                        help="report tables differing only in whitespace or merged-cell spill as the same")
+    parser.add_argument("--report", metavar="DIR",
+                        help="write a static HTML report (index.html + small PNGs) instead of opening windows")
+    parser.add_argument("--cache", nargs="?", const=DEFAULT_CACHE_PATH, metavar="SQLITE",
+                        help="reuse camelot tables of earlier runs from this page cache (default: the shared one)")
+    parser.add_argument("--benchmark", action="store_true", help="time pages x flavors without plotting")
+    parser.add_argument("--repeat", type=int, default=3, help="benchmark runs per page and flavor")
+    parser.add_argument("--out", default="camelot_benchmark.json", help="benchmark JSON (a .csv is written next to it)")
+    parser.add_argument("--baseline", help="earlier benchmark JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown as a fraction")
+    args = parser.parse_args()
+    if args.repeat < 1:
+        parser.error("--repeat must be at least 1")
+    if args.benchmark or args.report:
+        plt.switch_backend("Agg")  # headless: no window is ever opened
+
+    FLAVORS = [flavor.strip() for flavor in args.flavors.split(",") if flavor.strip()]
+    FUZZY_DEDUP = args.fuzzy_dedup
+    filename, page_list = resolve_pages(args.file, args.pages)
+    cache_at = (args.cache, file_hash(filename)) if args.cache else None
+    if args.benchmark:
+        results = run_benchmark(filename, page_list, FLAVORS, args.repeat)
+        write_benchmark(results, args.out, filename, args.repeat)
+        if args.baseline:
+            try:
+                regressions = compare_benchmark(results, args.baseline, filename, args.repeat, args.tolerance)
+            except ValueError as mismatch:
+                print(f"Cannot compare: {mismatch}")
+                sys.exit(2)
+            for regression in regressions:
+                print("REGRESSION", regression)
+            print(f"{len(regressions)} regression(s) against {args.baseline}")
+            sys.exit(1 if regressions else 0)
+    elif args.report:
+        # Generators: each page is parsed only when the report is ready to write it
+        if args.workers > 1:
+            pages = iter_pages_parallel(filename, page_list, args.workers, args.route, cache_at)
+        else:
+            pages = (parse_page(filename, page, args.route, cache_at) for page in page_list)
+        write_html_report(pages, args.report, f"{os.path.basename(filename)} pages {args.pages}")
+    else:
+        if args.workers > 1:
+            pages_data = parse_pages_parallel(filename, page_list, args.workers, args.route, cache_at)
+        else:
+            pages_data = [parse_page(filename, page, args.route, cache_at) for page in page_list]  # Store all page data here
+        show_windows(pages_data)
@@ -0,0 +1,96 @@
+"""
+# chapter_manifest.py
+Virtual chapters for the chapter splitter's "manifest" mode. Instead of writing one PDF per chapter,
+the splitter writes a small JSON index of page ranges and ToC slices against the master PDF.
+Downstream scripts load the manifest and read a chapter as a page view of the master document,
+so fonts and images are never copied. open_chapters opens the master only once for all chapters;
+open_chapter opens it for one chapter, and the caller closes it (view.master_doc) when done.
+Manifest layout:
+- source: path of the master PDF (relative to the manifest folder when possible)
+- page_count: number of pages in the master PDF
+- chapters: list of {"name", "title", "start", "end", "toc"} with 0-based, end-exclusive page ranges
+  and ToC entries whose pages are relative to the chapter (as in the split chapter PDFs)
+"""
+
+import json
+import os
+import pymupdf as p
+
+MANIFEST_NAME = "chapters.manifest.json"
+
+def write_manifest(manifest_path, docname, page_count, chapters):
+    manifest_dir = os.path.dirname(os.path.abspath(manifest_path))
+    source = os.path.abspath(docname)
+    try:
+        source = os.path.relpath(source, manifest_dir)
+    except ValueError:
+        # Different drive on Windows, keep the absolute path
+        pass
+    manifest = {
+        "source": source,
+        "page_count": page_count,
+        "chapters": chapters,
+    }
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, ensure_ascii=False)
+
+def load_manifest(manifest_path):
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    manifest_dir = os.path.dirname(os.path.abspath(manifest_path))
+    manifest["source"] = os.path.normpath(os.path.join(manifest_dir, manifest["source"]))
+    return manifest
+
+def find_chapter(manifest, name):
+    """Look up a chapter by its file name stem or its ToC title"""
+    for chapter in manifest["chapters"]:
+        if name in (chapter["name"], chapter["title"]):
+            return chapter
+    raise KeyError(f"Chapter not found in manifest: {name}")
+
+def chapter_pages_string(chapter):
+    """1-based inclusive page string of the chapter in the master PDF (camelot's `pages` format)"""
+    return f"{chapter['start'] + 1}-{chapter['end']}"
+
+class ChapterView:
+    """Page view of one chapter of the master document; behaves like a pymupdf Document for reading"""
+    def __init__(self, master_doc, chapter):
+        self.master_doc = master_doc
+        self.source = master_doc.name
+        self.name = chapter["name"]
+        self.title = chapter["title"]
+        self.start = chapter["start"]
+        self.end = chapter["end"]
+        self.toc = chapter["toc"]
+
+    @property
+    def page_count(self):
+        return self.end - self.start
+
+    def __len__(self):
+        return self.page_count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.page_count
+        if not 0 <= index < self.page_count:
+            raise IndexError("page not in chapter")
+        return self.master_doc[self.start + index]
+
+    def __iter__(self):
+        for page_num in range(self.start, self.end):
+            yield self.master_doc[page_num]
+
+    def get_toc(self):
+        return [list(entry) for entry in self.toc]
+
+def open_chapter(manifest_path, name):
+    """Open the master PDF and return a ChapterView of one chapter"""
+    manifest = load_manifest(manifest_path)
+    return ChapterView(p.open(manifest["source"]), find_chapter(manifest, name))
+
+def open_chapters(manifest_path):
+    """Open the master PDF once and return a ChapterView for every chapter in the manifest"""
+    manifest = load_manifest(manifest_path)
+    master_doc = p.open(manifest["source"])
+    return [ChapterView(master_doc, chapter) for chapter in manifest["chapters"]]
@@ -1,37 +1,112 @@
 # this file is used to clean the headers and footers of the text files
 import os
 import re
+import json
+import zlib
+from itertools import islice
 from collections import Counter
+import numpy as np
 from pathlib import Path
+import pymupdf as p
+from page_blocks import extract_page_blocks, blocks_to_text, get_cached_page_blocks, sort_blocks
+from page_cache import file_hash
+
+DIGIT_RUN = re.compile(r'\d+')
+WHITESPACE_RUN = re.compile(r'\s+')
+
+# Streaming pass: drop header/footer candidates that can no longer become common every this many pages
+PRUNE_EVERY = 50
+
+# Learned headers/footers are saved here as <family>.json, see PDFHeaderFooterCleaner.save_profile
+DEFAULT_PROFILE_DIR = "header_footer_profiles"
+
+def normalize_line(line):
+    """Mask digit runs and collapse whitespace, so 'Page 12 of 400' and 'Page 13 of 400' share one key"""
+    return WHITESPACE_RUN.sub(' ', DIGIT_RUN.sub('#', line)).strip()
 
 class PDFHeaderFooterCleaner:
-    def __init__(self, folder_path, output_folder=None, threshold=0.7, header_lines=5, footer_lines=5):
+    def __init__(self, folder_path, output_folder=None, threshold=0.7, header_lines=5, footer_lines=5,
+                 pdf_path=None, workers=1, cache=None, family=None, profile_dir=DEFAULT_PROFILE_DIR,
+                 min_hit_rate=0.6, profile_sample_pages=20):
+        # pdf_path: read page text straight from the PDF (page-sharded over `workers`) instead of page*.txt files
+        # cache: optional page_cache.PageCache for the blocks read from pdf_path
+        # family: document family whose saved header/footer profile is reused; the profile is relearned
+        #         when it matches fewer than min_hit_rate of the first profile_sample_pages pages
         self.folder_path = folder_path
-        self.output_folder = output_folder or f"{folder_path}_cleaned"
+        self.pdf_path = pdf_path
+        self.workers = workers
+        self.cache = cache
+        self.output_folder = output_folder or f"{folder_path or pdf_path}_cleaned"
         self.threshold = threshold
         self.header_lines = header_lines
         self.footer_lines = footer_lines
+        self.family = family
+        self.profile_dir = profile_dir
+        self.min_hit_rate = min_hit_rate
+        self.profile_sample_pages = profile_sample_pages
         self.pages = {}
         self.common_headers = {}
         self.common_footers = {}
+        # Normalized keys of the common headers/footers per line position, for hash lookups
+        self.header_keys = {}
+        self.footer_keys = {}
 
-    def read_page_files(self):
-        """Read all page files and return a dictionary of page_num -> content"""
-        pages = {}
-        folder = Path(self.folder_path)
-        for file_path in folder.glob("page*.txt"):
+    def page_files(self):
+        """Sorted (page_num, path) of the page*.txt files"""
+        files = []
+        for file_path in Path(self.folder_path).glob("page*.txt"):
             match = re.search(r'page[_]?(\d+)', file_path.stem)
             if match:
-                page_num = int(match.group(1))
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                        pages[page_num] = content
-                except UnicodeDecodeError:
-                    with open(file_path, 'r', encoding='latin-1') as f:
-                        content = f.read()
-                        pages[page_num] = content
-        self.pages = pages
+                files.append((int(match.group(1)), file_path))
+        return sorted(files)
+
+    @staticmethod
+    def read_text_file(file_path):
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                return f.read()
+        except UnicodeDecodeError:
+            with open(file_path, 'r', encoding='latin-1') as f:
+                return f.read()
+
+    def read_page_files(self):
+        """Read all page files and return a dictionary of page_num -> content"""
+        self.pages = {page_num: self.read_text_file(file_path) for page_num, file_path in self.page_files()}
+
+    def read_pdf_pages(self):
+        """Read page text from self.pdf_path into self.pages, numbered from 1"""
+        page_blocks = extract_page_blocks(self.pdf_path, workers=self.workers, cache=self.cache)
+        self.pages = {page_num: blocks_to_text(blocks) for page_num, blocks in enumerate(page_blocks, 1)}
+
+    def count_pages(self):
+        if self.pdf_path:
+            with p.open(self.pdf_path) as doc:
+                return doc.page_count
+        return len(self.page_files())
+
+    def read_pages(self):
+        if self.pdf_path:
+            self.read_pdf_pages()
+        else:
+            self.read_page_files()
+
+    def iter_pages(self):
+        """Yield (page_num, content) one page at a time, in page order, without keeping pages in memory"""
+        if self.pdf_path:
+            doc = p.open(self.pdf_path)
+            try:
+                doc_hash = file_hash(self.pdf_path) if self.cache is not None else None
+                for page_idx in range(doc.page_count):
+                    if self.cache is not None:
+                        blocks = get_cached_page_blocks(doc, page_idx, doc_hash, self.cache)
+                    else:
+                        blocks = sort_blocks(doc[page_idx].get_text("blocks"))
+                    yield page_idx + 1, blocks_to_text(blocks)
+            finally:
+                doc.close()
+        else:
+            for page_num, file_path in self.page_files():
+                yield page_num, self.read_text_file(file_path)
 
     @staticmethod
     def extract_lines(text, num_lines=5):
@@ -41,73 +116,165 @@ class PDFHeaderFooterCleaner:
         last_lines = lines[-num_lines:] if len(lines) > num_lines else []
         return first_lines, last_lines
 
+    def count_edge_lines(self, content, header_counter, footer_counter, examples, admit_new=True):
+        """Count one page's first/last lines by (position, normalized line).
+        admit_new=False only counts lines that are already being counted."""
+        first_lines, last_lines = self.extract_lines(content, max(self.header_lines, self.footer_lines))
+        for i in range(min(self.header_lines, len(first_lines))):
+            line = first_lines[i].strip()
+            if line:
+                key = (i, normalize_line(line))
+                if admit_new or key in header_counter:
+                    header_counter[key] += 1
+                    examples.setdefault(('header',) + key, line)
+        for i in range(min(self.footer_lines, len(last_lines))):
+            line = last_lines[i].strip()
+            if line:
+                key = (i, normalize_line(line))
+                if admit_new or key in footer_counter:
+                    footer_counter[key] += 1
+                    examples.setdefault(('footer',) + key, line)
+
+    @staticmethod
+    def prune_counts(counter, examples, kind, min_occurrences, remaining_pages):
+        """Drop keys that stay below min_occurrences even if they appear on every remaining page"""
+        for key in [key for key, count in counter.items() if count + remaining_pages < min_occurrences]:
+            del counter[key]
+            del examples[(kind,) + key]
+
+    def learn_patterns(self, page_count, header_counter, footer_counter, examples):
+        min_occurrences = int(page_count * self.threshold)
+        self.header_keys = self.select_common(header_counter, min_occurrences)
+        self.footer_keys = self.select_common(footer_counter, min_occurrences)
+        # Keep one example line per learned key for reporting
+        self.common_headers = {pos: [examples[('header', pos, key)] for key in keys]
+                               for pos, keys in self.header_keys.items()}
+        self.common_footers = {pos: [examples[('footer', pos, key)] for key in keys]
+                               for pos, keys in self.footer_keys.items()}
+
     def find_common_patterns(self):
-        """Find common header and footer patterns across pages"""
-        all_headers = []
-        all_footers = []
-        for page_num, content in self.pages.items():
-            first_lines, last_lines = self.extract_lines(content, max(self.header_lines, self.footer_lines))
-            for i in range(min(self.header_lines, len(first_lines))):
-                if i < len(first_lines) and first_lines[i].strip():
-                    all_headers.append((i, first_lines[i].strip()))
-            for i in range(min(self.footer_lines, len(last_lines))):
-                if i < len(last_lines) and last_lines[i].strip():
-                    all_footers.append((i, last_lines[i].strip()))
-        header_counter = Counter(all_headers)
-        footer_counter = Counter(all_footers)
-        min_occurrences = int(len(self.pages) * self.threshold)
-        common_headers = {}
-        common_footers = {}
-        for (pos, line), count in header_counter.items():
-            if count >= min_occurrences:
-                if pos not in common_headers:
-                    common_headers[pos] = []
-                common_headers[pos].append(line)
-        for (pos, line), count in footer_counter.items():
+        """Find common header and footer patterns across pages, counted by normalized line"""
+        header_counter = Counter()
+        footer_counter = Counter()
+        examples = {}
+        for content in self.pages.values():
+            self.count_edge_lines(content, header_counter, footer_counter, examples)
+        self.learn_patterns(len(self.pages), header_counter, footer_counter, examples)
+
+    @staticmethod
+    def select_common(counter, min_occurrences):
+        """{position: set of normalized lines} seen at least min_occurrences times"""
+        common = {}
+        for (pos, key), count in counter.items():
             if count >= min_occurrences:
-                if pos not in common_footers:
-                    common_footers[pos] = []
-                common_footers[pos].append(line)
-        self.common_headers = common_headers
-        self.common_footers = common_footers
+                common.setdefault(pos, set()).add(key)
+        return common
+
+    @staticmethod
+    def matches(line, keys):
+        # A blank line at a learned position counts as part of the header/footer
+        return not line or normalize_line(line) in keys
 
     def remove_common_patterns(self, text):
         """Remove identified common headers and footers from text"""
         lines = text.split('\n')
         lines_to_remove_start = 0
-        for pos in sorted(self.common_headers.keys()):
-            if pos < len(lines):
-                line = lines[pos].strip()
-                if any(pattern in line or line in pattern for pattern in self.common_headers[pos]):
-                    lines_to_remove_start = max(lines_to_remove_start, pos + 1)
+        for pos, keys in self.header_keys.items():
+            if pos < len(lines) and self.matches(lines[pos].strip(), keys):
+                lines_to_remove_start = max(lines_to_remove_start, pos + 1)
         lines_to_remove_end = 0
-        for pos in sorted(self.common_footers.keys()):
-            if pos < len(lines):
-                line = lines[-(pos + 1)].strip()
-                if any(pattern in line or line in pattern for pattern in self.common_footers[pos]):
-                    lines_to_remove_end = max(lines_to_remove_end, pos + 1)
+        for pos, keys in self.footer_keys.items():
+            if pos < len(lines) and self.matches(lines[-(pos + 1)].strip(), keys):
+                lines_to_remove_end = max(lines_to_remove_end, pos + 1)
         if lines_to_remove_end > 0:
             cleaned_lines = lines[lines_to_remove_start:-lines_to_remove_end]
         else:
             cleaned_lines = lines[lines_to_remove_start:]
         return '\n'.join(cleaned_lines)
 
+    def profile_path(self):
+        safe_family = "".join(c if c.isalnum() or c in "._-" else "_" for c in self.family)
+        return os.path.join(self.profile_dir, f"{safe_family}.json")
+
+    def save_profile(self):
+        """Save the learned headers/footers and their normalized keys for self.family"""
+        os.makedirs(self.profile_dir, exist_ok=True)
+        profile = {
+            "family": self.family,
+            "header_lines": self.header_lines,
+            "footer_lines": self.footer_lines,
+            "common_headers": self.common_headers,
+            "common_footers": self.common_footers,
+            "header_keys": {pos: sorted(keys) for pos, keys in self.header_keys.items()},
+            "footer_keys": {pos: sorted(keys) for pos, keys in self.footer_keys.items()},
+        }
+        with open(self.profile_path(), 'w', encoding='utf-8') as f:
+            json.dump(profile, f, indent=1, ensure_ascii=False)
+
+    def has_profile(self):
+        return bool(self.family) and os.path.exists(self.profile_path())
+
+    def load_profile(self):
+        """Load the profile of self.family; returns False when there is none"""
+        if not self.has_profile():
+            return False
+        with open(self.profile_path(), 'r', encoding='utf-8') as f:
+            profile = json.load(f)
+        # JSON object keys are strings, positions are ints
+        self.common_headers = {int(pos): lines for pos, lines in profile["common_headers"].items()}
+        self.common_footers = {int(pos): lines for pos, lines in profile["common_footers"].items()}
+        self.header_keys = {int(pos): set(keys) for pos, keys in profile["header_keys"].items()}
+        self.footer_keys = {int(pos): set(keys) for pos, keys in profile["footer_keys"].items()}
+        return True
+
+    def profile_hit_rate(self, contents):
+        """Fraction of pages where at least one non-blank learned header or footer line is found"""
+        pages = hits = 0
+        for content in contents:
+            pages += 1
+            lines = content.split('\n')
+            found = any(pos < len(lines) and lines[pos].strip() and self.matches(lines[pos].strip(), keys)
+                        for pos, keys in self.header_keys.items())
+            found = found or any(pos < len(lines) and lines[-(pos + 1)].strip()
+                                 and self.matches(lines[-(pos + 1)].strip(), keys)
+                                 for pos, keys in self.footer_keys.items())
+            hits += found
+        return hits / pages if pages else 0.0
+
+    def apply_profile(self, sample_contents):
+        """Use the family profile if it exists and still matches the sample pages"""
+        if not self.load_profile():
+            return False
+        hit_rate = self.profile_hit_rate(sample_contents)
+        if hit_rate < self.min_hit_rate:
+            print(f"Profile '{self.family}' matches only {hit_rate:.0%} of sampled pages, relearning...")
+            return False
+        print(f"Using profile '{self.family}' ({hit_rate:.0%} of sampled pages matched)")
+        return True
+
+    def print_patterns(self, position_label="Line {}"):
+        print(f"\nFound common headers (appearing in at least {self.threshold*100}% of pages):")
+        for pos, patterns in self.common_headers.items():
+            print(f"  {position_label.format(pos)}: {patterns}")
+        print(f"\nFound common footers (appearing in at least {self.threshold*100}% of pages):")
+        for pos, patterns in self.common_footers.items():
+            print(f"  {position_label.format(pos)}: {patterns}")
+
     def clean_pages(self):
         """Main function to clean all pages"""
         print("Reading page files...")
-        self.read_page_files()
+        self.read_pages()
         print(f"Found {len(self.pages)} pages")
         if len(self.pages) == 0:
             print("No page files found!")
             return
-        print("Analyzing common headers and footers...")
-        self.find_common_patterns()
-        print(f"\nFound common headers (appearing in at least {self.threshold*100}% of pages):")
-        for pos, patterns in self.common_headers.items():
-            print(f"  Line {pos}: {patterns}")
-        print(f"\nFound common footers (appearing in at least {self.threshold*100}% of pages):")
-        for pos, patterns in self.common_footers.items():
-            print(f"  Line {pos}: {patterns}")
+        sample = [self.pages[page_num] for page_num in sorted(self.pages)[:self.profile_sample_pages]]
+        if not self.apply_profile(sample):
+            print("Analyzing common headers and footers...")
+            self.find_common_patterns()
+            if self.family:
+                self.save_profile()
+        self.print_patterns()
         os.makedirs(self.output_folder, exist_ok=True)
         print(f"\nCleaning pages and saving to {self.output_folder}...")
         for page_num in sorted(self.pages.keys()):
@@ -119,6 +286,140 @@ class PDFHeaderFooterCleaner:
         print(f"Cleaned {len(self.pages)} pages successfully!")
         return self.common_headers, self.common_footers
 
+    def clean_pages_streaming(self, combined_name="all_cleaned.txt"):
+        """Two passes over the pages, one page in memory at a time: the first only collects header/footer
+        statistics, the second cleans each page once and writes both its page file and the combined file.
+        With a matching family profile the first pass is skipped.
+        The first pass knows the page count up front and only keeps counting lines that can still reach
+        the threshold: candidates that cannot are pruned every PRUNE_EVERY pages, and once fewer pages remain
+        than the threshold needs, new lines are not counted at all. The counters then stop growing; their
+        size is set by the distinct edge lines of the first (1 - threshold) share of the pages."""
+        total_pages = self.count_pages()
+        if not total_pages:
+            print("No page files found!")
+            return
+        profile_matches = False
+        if self.has_profile():
+            pages = self.iter_pages()
+            sample = [content for _, content in islice(pages, self.profile_sample_pages)]
+            pages.close()
+            profile_matches = self.apply_profile(sample)
+        if not profile_matches:
+            print("Analyzing common headers and footers...")
+            header_counter = Counter()
+            footer_counter = Counter()
+            examples = {}
+            min_occurrences = int(total_pages * self.threshold)
+            page_count = 0
+            for _, content in self.iter_pages():
+                # A line first seen on this page can still be common if enough pages are left
+                admit_new = total_pages - page_count >= min_occurrences
+                self.count_edge_lines(content, header_counter, footer_counter, examples, admit_new)
+                page_count += 1
+                if page_count % PRUNE_EVERY == 0:
+                    remaining_pages = total_pages - page_count
+                    self.prune_counts(header_counter, examples, 'header', min_occurrences, remaining_pages)
+                    self.prune_counts(footer_counter, examples, 'footer', min_occurrences, remaining_pages)
+            print(f"Found {page_count} pages")
+            self.learn_patterns(page_count, header_counter, footer_counter, examples)
+            if self.family:
+                self.save_profile()
+        self.print_patterns()
+        page_count = 0
+        os.makedirs(self.output_folder, exist_ok=True)
+        print(f"\nCleaning pages and saving to {self.output_folder}...")
+        with open(os.path.join(self.output_folder, combined_name), 'w', encoding='utf-8') as combined:
+            for page_num, content in self.iter_pages():
+                cleaned_content = self.remove_common_patterns(content)
+                output_file = os.path.join(self.output_folder, f"page_{page_num}_cleaned.txt")
+                with open(output_file, 'w', encoding='utf-8') as f:
+                    f.write(cleaned_content)
+                if page_count:
+                    combined.write("\n")
+                combined.write(cleaned_content)
+                page_count += 1
+        print(f"Cleaned {page_count} pages successfully!")
+        return self.common_headers, self.common_footers
+
+    def clean_pdf_geometry(self, band=0.12, y_tolerance=3.0, combined_name="all_cleaned.txt"):
+        """Remove headers/footers straight from self.pdf_path using block positions, without page*.txt files.
+        A text block is a header (footer) when it lies in the top (bottom) `band` fraction of the page and the
+        same normalized text appears at the same distance from the top (bottom) edge on at least `threshold` of
+        the pages. Distances of the same text are clustered: sorted, they stay one cluster while neighbouring
+        distances are at most y_tolerance points apart."""
+        doc = p.open(self.pdf_path)
+        heights = [page.rect.height for page in doc]
+        doc.close()
+        page_blocks = extract_page_blocks(self.pdf_path, workers=self.workers, cache=self.cache)
+        print(f"Found {len(page_blocks)} pages")
+        if not page_blocks:
+            return
+        # One row per text block in a band: zone (0 top, 1 bottom), binned edge distance, text hash, page
+        rows = []
+        row_blocks = []
+        for page_idx, blocks in enumerate(page_blocks):
+            height = heights[page_idx]
+            for block_idx, block in enumerate(blocks):
+                if block[6] != 0 or not block[4].strip():
+                    continue
+                if block[3] <= band * height:
+                    zone, distance = 0, block[1]
+                elif block[1] >= (1 - band) * height:
+                    zone, distance = 1, height - block[3]
+                else:
+                    continue
+                text_hash = zlib.crc32(normalize_line(block[4]).encode("utf-8"))
+                rows.append((zone, text_hash, page_idx, distance))
+                row_blocks.append((page_idx, block_idx))
+        remove = set()
+        self.common_headers, self.common_footers = {}, {}
+        if rows:
+            ids = np.array([row[:3] for row in rows], dtype=np.int64)
+            distances = np.array([row[3] for row in rows], dtype=float)
+            # Cluster the edge distances per (zone, text): sorted by zone, text and distance, a new key starts
+            # where zone or text changes or the distance jumps by more than y_tolerance
+            order = np.lexsort((distances, ids[:, 1], ids[:, 0]))
+            new_key = np.ones(len(order), dtype=bool)
+            new_key[1:] = ((np.diff(ids[order, 0]) != 0) | (np.diff(ids[order, 1]) != 0)
+                           | (np.diff(distances[order]) > y_tolerance))
+            inverse = np.empty(len(order), dtype=np.int64)
+            inverse[order] = np.cumsum(new_key) - 1
+            key_count = int(inverse.max()) + 1
+            key_distances = np.bincount(inverse, weights=distances) / np.bincount(inverse)
+            # Number of distinct pages per (zone, distance cluster, text) key
+            key_pages = np.unique(np.stack([inverse, ids[:, 2]], axis=1), axis=0)
+            page_counts = np.bincount(key_pages[:, 0], minlength=key_count)
+            min_pages = max(int(len(page_blocks) * self.threshold), 2)
+            is_common = page_counts[inverse] >= min_pages
+            # Report one example block per common key, by its distance from the page edge in points
+            reported = set()
+            for row_idx in np.flatnonzero(is_common):
+                page_idx, block_idx = row_blocks[row_idx]
+                remove.add((page_idx, block_idx))
+                if inverse[row_idx] not in reported:
+                    reported.add(inverse[row_idx])
+                    zone, distance = int(ids[row_idx, 0]), int(round(key_distances[inverse[row_idx]]))
+                    found = self.common_headers if zone == 0 else self.common_footers
+                    found.setdefault(distance, []).append(page_blocks[page_idx][block_idx][4].strip())
+        print(f"\nRemoving {len(remove)} header/footer blocks "
+              f"(repeating on at least {self.threshold*100}% of pages)")
+        # Keys are distances from the page edge in points
+        self.print_patterns(position_label="y={}pt")
+        os.makedirs(self.output_folder, exist_ok=True)
+        with open(os.path.join(self.output_folder, combined_name), 'w', encoding='utf-8') as combined:
+            for page_idx, blocks in enumerate(page_blocks):
+                kept = [block for block_idx, block in enumerate(blocks) if (page_idx, block_idx) not in remove]
+                cleaned_content = blocks_to_text(kept)
+                output_file = os.path.join(self.output_folder, f"page_{page_idx + 1}_cleaned.txt")
+                with open(output_file, 'w', encoding='utf-8') as f:
+                    f.write(cleaned_content)
+                if page_idx:
+                    # Page texts have no trailing newline; keep the last word of a page off the next page
+                    combined.write("\n")
+                combined.write(cleaned_content)
+        print(f"Cleaned {len(page_blocks)} pages successfully!")
+        return self.common_headers, self.common_footers
+
 # Example usage
 if __name__ == "__main__":
     cleaner = PDFHeaderFooterCleaner(
@@ -126,13 +427,8 @@ if __name__ == "__main__":
         output_folder="at90can128_rm.cleaned_txt",
         threshold=0.7,
         header_lines=5,
-        footer_lines=5
+        footer_lines=5,
+        family="at90can128_rm"
     )
-    common_headers, common_footers = cleaner.clean_pages()
-    # join all pages after clean into one file
-    with open("at90can128_rm.cleaned_txt/all_cleaned.txt", 'w', encoding='utf-8') as f:
-        for page_num in sorted(cleaner.pages.keys()):
-            content = cleaner.pages[page_num]
-            cleaned_content = cleaner.remove_common_patterns(content)
-            f.write(cleaned_content)
-   
+    # writes the cleaned pages and all pages joined into all_cleaned.txt
+    common_headers, common_footers = cleaner.clean_pages_streaming("all_cleaned.txt")
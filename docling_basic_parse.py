@@ -1,7 +1,16 @@
 from docling.document_converter import DocumentConverter
+from chapter_manifest import load_manifest, find_chapter
 
 
 source = r"C:\Users\E40065689\Desktop\pdf_parse\at90can128_rm.pdf_chapters\4__Memories.pdf"
+# Optionally convert a virtual chapter straight from the master PDF of a splitter manifest
+MANIFEST = None  # e.g. r"C:\Users\E40065689\Desktop\pdf_parse\at90can128_rm.pdf_chapters\chapters.manifest.json"
+CHAPTER = "4__Memories"
 converter = DocumentConverter()
-result = converter.convert(source)
-print(result.document.export_to_markdown())  
\ No newline at end of file
+if MANIFEST:
+    manifest = load_manifest(MANIFEST)
+    chapter = find_chapter(manifest, CHAPTER)
+    result = converter.convert(manifest["source"], page_range=(chapter["start"] + 1, chapter["end"]))
+else:
+    result = converter.convert(source)
+print(result.document.export_to_markdown())  
@@ -0,0 +1,81 @@
+"""
+# page_blocks.py
+Page-sharded text block extraction with pymupdf. The page range is split into contiguous shards,
+each shard is extracted in a worker process with its own pymupdf handle, and the per-page block
+lists are merged back in page order. Blocks are the tuples of `page.get_text("blocks")`, sorted
+top-to-bottom, left-to-right.
+With a page_cache.PageCache, pages already extracted from the same PDF content are served from the
+cache and only the missing pages are extracted.
+Used by process_pdf_toc_sections (PDFBlockProcessor) and clean_headers_footers.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import pymupdf as p
+from page_cache import file_hash
+
+# Cache extractor name for sorted pymupdf blocks
+BLOCKS_EXTRACTOR = "pymupdf.blocks"
+
+# Below this many pages per worker, starting processes costs more than it saves
+MIN_PAGES_PER_SHARD = 8
+
+def sort_blocks(blocks):
+    blocks.sort(key=lambda b: (b[1], b[0]))
+    return blocks
+
+def extract_blocks(doc, page_numbers):
+    return [sort_blocks(doc[page_num].get_text("blocks")) for page_num in page_numbers]
+
+def _extract_shard(pdf_path, page_numbers):
+    doc = p.open(pdf_path)
+    try:
+        return extract_blocks(doc, page_numbers)
+    finally:
+        doc.close()
+
+def shard_pages(page_numbers, shards):
+    """Split page_numbers into at most `shards` contiguous chunks of near-equal size"""
+    size = max(-(-len(page_numbers) // shards), 1)
+    return [page_numbers[i:i + size] for i in range(0, len(page_numbers), size)]
+
+def extract_page_blocks(pdf_path, pages=None, workers=1, cache=None):
+    """Return one sorted block list per page in `pages` (0-based, default all pages), in the given order"""
+    doc = p.open(pdf_path)
+    try:
+        page_numbers = list(pages) if pages is not None else list(range(doc.page_count))
+        cached = {}
+        if cache is not None:
+            doc_hash = file_hash(pdf_path)
+            cached = cache.get_many(doc_hash, page_numbers, BLOCKS_EXTRACTOR)
+        missing = [page_num for page_num in page_numbers if page_num not in cached]
+        workers = min(workers, len(missing) // MIN_PAGES_PER_SHARD)
+        if workers <= 1:
+            extracted = extract_blocks(doc, missing)
+    finally:
+        doc.close()
+    if workers > 1:
+        extracted = []
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            shards = shard_pages(missing, workers)
+            for shard_blocks in pool.map(_extract_shard, [pdf_path] * len(shards), shards):
+                extracted.extend(shard_blocks)
+    if cache is not None and missing:
+        cache.put_many(doc_hash, dict(zip(missing, extracted)), BLOCKS_EXTRACTOR)
+    cached.update(zip(missing, extracted))
+    return [cached[page_num] for page_num in page_numbers]
+
+def get_cached_page_blocks(doc, page_num, doc_hash, cache):
+    """Sorted blocks of one page of an open document, through the cache"""
+    blocks = cache.get(doc_hash, page_num, BLOCKS_EXTRACTOR)
+    if blocks is None:
+        blocks = sort_blocks(doc[page_num].get_text("blocks"))
+        cache.put(doc_hash, page_num, BLOCKS_EXTRACTOR, blocks)
+    return blocks
+
+def blocks_to_text(blocks):
+    """Plain page text from text blocks (image blocks are skipped), one block after another"""
+    lines = []
+    for block in blocks:
+        if block[6] == 0:
+            lines.append(block[4].rstrip("\n"))
+    return "\n".join(lines)
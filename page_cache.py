@@ -0,0 +1,191 @@
+"""
+# page_cache.py
+Persistent page-level extraction cache shared by the scripts in this repo.
+Entries are keyed by the PDF content hash, page number, extractor name and extractor options, and hold
+JSON values (text blocks, words with bboxes, table rows). Everything lives in one SQLite file with
+size-bounded LRU eviction and hit/miss statistics, so re-running a tool on an unchanged PDF skips the
+re-parse of every page it has already seen.
+Note: values come back from JSON, so tuples (e.g. pymupdf blocks) are returned as lists.
+Writes are buffered: close() the cache (or use it as a context manager) so the last entries are stored.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+DEFAULT_CACHE_PATH = os.environ.get("PDF_PARSE_CACHE") or os.path.join(
+    os.path.expanduser("~"), ".pdf_parse_cache", "pages.sqlite")
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024  # 1 GB
+
+_file_hashes = {}
+
+def file_hash(path):
+    """SHA-256 of the file content, memoized per path, size and modification time"""
+    st = os.stat(path)
+    memo_key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    if memo_key not in _file_hashes:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(chunk)
+        _file_hashes[memo_key] = h.hexdigest()
+    return _file_hashes[memo_key]
+
+class PageCache:
+    """Writes and last-used times are buffered and flushed in one transaction every FLUSH_EVERY entries
+    and on close(); the total size is kept in a meta row, so eviction only scans the table when the
+    cache is over max_bytes."""
+    FLUSH_EVERY = 200
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._pending = {}  # key -> row waiting to be written
+        self._touched = {}  # key -> last_used waiting to be written
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "key TEXT PRIMARY KEY, doc_hash TEXT, page INTEGER, extractor TEXT, options TEXT, "
+            "value TEXT, size INTEGER, last_used REAL)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS pages_last_used ON pages (last_used)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER)")
+        if self.conn.execute("SELECT value FROM meta WHERE name = 'bytes'").fetchone() is None:
+            # Caches written before the running total existed are summed once
+            self.conn.execute("INSERT OR IGNORE INTO meta SELECT 'bytes', COALESCE(SUM(size), 0) FROM pages")
+        self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @staticmethod
+    def make_key(doc_hash, page, extractor, options=None):
+        return f"{doc_hash}:{page}:{extractor}:{json.dumps(options or {}, sort_keys=True)}"
+
+    def get_many(self, doc_hash, pages, extractor, options=None):
+        """Return {page: value} for the cached pages among `pages`; counts a hit or miss per page"""
+        pages = list(pages)
+        keys = {self.make_key(doc_hash, page, extractor, options): page for page in pages}
+        found = {}
+        key_list = []
+        for key, page in keys.items():
+            if key in self._pending:
+                found[page] = json.loads(self._pending[key][5])
+            else:
+                key_list.append(key)
+        # Stay under SQLite's bound-parameter limit
+        for i in range(0, len(key_list), 500):
+            chunk = key_list[i:i + 500]
+            rows = self.conn.execute(
+                f"SELECT key, value FROM pages WHERE key IN ({','.join('?' * len(chunk))})", chunk).fetchall()
+            for key, value in rows:
+                found[keys[key]] = json.loads(value)
+        if found:
+            now = time.time()
+            for page in found:
+                self._touched[self.make_key(doc_hash, page, extractor, options)] = now
+            if len(self._touched) >= self.FLUSH_EVERY:
+                self.flush()
+        self.hits += len(found)
+        self.misses += len(pages) - len(found)
+        return found
+
+    def get(self, doc_hash, page, extractor, options=None):
+        """Cached value or None"""
+        return self.get_many(doc_hash, [page], extractor, options).get(page)
+
+    def put_many(self, doc_hash, values, extractor, options=None):
+        """Store {page: value}; written with the next flush, after which least recently used entries
+        beyond max_bytes are evicted"""
+        now = time.time()
+        options_json = json.dumps(options or {}, sort_keys=True)
+        for page, value in values.items():
+            key = self.make_key(doc_hash, page, extractor, options)
+            value_json = json.dumps(value, ensure_ascii=False)
+            self._pending[key] = (key, doc_hash, page, extractor, options_json, value_json,
+                                  len(value_json.encode("utf-8")), now)
+            self._touched.pop(key, None)
+        if len(self._pending) >= self.FLUSH_EVERY:
+            self.flush()
+
+    def put(self, doc_hash, page, extractor, value, options=None):
+        self.put_many(doc_hash, {page: value}, extractor, options)
+
+    def flush(self):
+        """Write the buffered entries and last-used times in one transaction, then evict if needed"""
+        if not self._pending and not self._touched:
+            return
+        rows = list(self._pending.values())
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Replaced entries give back their old size
+            replaced = 0
+            for i in range(0, len(rows), 500):
+                chunk = [row[0] for row in rows[i:i + 500]]
+                replaced += self.conn.execute(
+                    f"SELECT COALESCE(SUM(size), 0) FROM pages WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk).fetchone()[0]
+            self.conn.executemany("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self.conn.executemany("UPDATE pages SET last_used = ? WHERE key = ?",
+                                  [(used, key) for key, used in self._touched.items()])
+            self.conn.execute("UPDATE meta SET value = value + ? WHERE name = 'bytes'",
+                              (sum(row[6] for row in rows) - replaced,))
+            self.conn.commit()
+        except BaseException:
+            self.conn.rollback()
+            raise
+        self._pending.clear()
+        self._touched.clear()
+        if rows:
+            self.evict()
+
+    def total_bytes(self):
+        return self.conn.execute("SELECT value FROM meta WHERE name = 'bytes'").fetchone()[0]
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in max_bytes; returns their number"""
+        total = self.total_bytes()
+        if total <= self.max_bytes:
+            return 0
+        to_delete, freed = [], 0
+        for key, size in self.conn.execute("SELECT key, size FROM pages ORDER BY last_used"):
+            if total - freed <= self.max_bytes:
+                break
+            to_delete.append((key,))
+            freed += size
+        self.conn.executemany("DELETE FROM pages WHERE key = ?", to_delete)
+        self.conn.execute("UPDATE meta SET value = value - ? WHERE name = 'bytes'", (freed,))
+        self.conn.commit()
+        return len(to_delete)
+
+    def stats(self):
+        self.flush()
+        entries = self.conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": self.total_bytes(),
+        }
+
+    def clear(self):
+        self._pending.clear()
+        self._touched.clear()
+        self.conn.execute("DELETE FROM pages")
+        self.conn.execute("UPDATE meta SET value = 0 WHERE name = 'bytes'")
+        self.conn.commit()
+
+    def close(self):
+        self.flush()
+        self.conn.close()
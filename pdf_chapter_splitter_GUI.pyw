@@ -1,13 +1,134 @@
 import os
+import json
+import hashlib
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import tkinter as tk
 from tkinter import filedialog, messagebox, scrolledtext
 import pymupdf as p
+from chapter_manifest import MANIFEST_NAME, write_manifest
+
+# Compact chapter output: drop unused objects, merge duplicate objects (fonts, images), compress streams
+OPTIMIZED_SAVE_OPTIONS = dict(garbage=4, clean=True, deflate=True, deflate_images=True, deflate_fonts=True)
+
+def write_chapter(src_doc, start, end, chapter_toc, output_path, optimize=False, subset_fonts=False):
+    # Returns the bytes saved against a default save when optimize or subset_fonts is set, else None
+    new_doc = p.open()
+    new_doc.insert_pdf(src_doc, from_page=start, to_page=end - 1)
+    if chapter_toc:
+        new_doc.set_toc(chapter_toc)
+    if not (optimize or subset_fonts):
+        new_doc.save(output_path)
+        new_doc.close()
+        return None
+    default_size = len(new_doc.tobytes())
+    if subset_fonts:
+        new_doc.subset_fonts()
+    new_doc.save(output_path, **(OPTIMIZED_SAVE_OPTIONS if optimize else {}))
+    new_doc.close()
+    return default_size - os.path.getsize(output_path)
+
+# Each worker process opens its own handle on the source PDF once and reuses it for all its chapters
+_worker_doc = None
+
+def _init_chapter_worker(docname):
+    global _worker_doc
+    _worker_doc = p.open(docname)
+
+def _write_chapter_job(start, end, chapter_toc, output_path, optimize, subset_fonts):
+    saved_bytes = write_chapter(_worker_doc, start, end, chapter_toc, output_path, optimize, subset_fonts)
+    return output_path, saved_bytes
+
+def saved_message(output_path, saved_bytes):
+    if saved_bytes is None:
+        return f"Saved: {output_path}\n"
+    return f"Saved: {output_path} ({saved_bytes / 1024:.1f} KB smaller than default save)\n"
+
+# Per-output-folder record of chapter fingerprints, used to skip unchanged chapters on re-split
+FINGERPRINTS_NAME = ".chapter_fingerprints.json"
+
+def load_fingerprints(output_dir):
+    path = os.path.join(output_dir, FINGERPRINTS_NAME)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_fingerprints(output_dir, fingerprints):
+    with open(os.path.join(output_dir, FINGERPRINTS_NAME), "w", encoding="utf-8") as f:
+        json.dump(fingerprints, f, indent=1, sort_keys=True)
+
+def chapter_fingerprint(src_doc, start, end, chapter_toc, options):
+    # Hash of the chapter's page content streams, its ToC slice and the output options
+    h = hashlib.sha256()
+    for page_num in range(start, end):
+        h.update(hashlib.sha256(src_doc[page_num].read_contents()).digest())
+    h.update(json.dumps([chapter_toc, options], ensure_ascii=False).encode("utf-8"))
+    return h.hexdigest()
+
+def chapter_file_stem(title):
+    return "".join(c if c.isalnum() else "_" for c in title)[:50]
+
+def chapter_file_stems(titles):
+    """chapter_file_stem of each title, with _2, _3, ... added to repeated stems (case-insensitively, for
+    Windows) so no two chapters share an output file, fingerprint entry or manifest name. The first
+    occurrence keeps the plain stem."""
+    stems, used = [], set()
+    for title in titles:
+        stem = base = chapter_file_stem(title)
+        n = 1
+        while stem.lower() in used:
+            n += 1
+            stem = f"{base}_{n}"
+        used.add(stem.lower())
+        stems.append(stem)
+    return stems
+
+def log_to_widget(output_widget, message):
+    if output_widget:
+        output_widget.insert(tk.END, message)
+        output_widget.see(tk.END)
+        output_widget.update_idletasks()
+
+class ToCIndex:
+    """Page-sorted index over a ToC for chapter ranges and ToC slices at any outline level"""
+    def __init__(self, toc):
+        self.toc = toc
+        self.order = sorted(range(len(toc)), key=lambda i: toc[i][2])
+        self.pages = [toc[i][2] for i in self.order]
+
+    def entries_between(self, start, end):
+        """ToC entries whose 0-based page lies in [start, end), in original ToC order"""
+        lo = bisect_left(self.pages, start + 1)
+        hi = bisect_left(self.pages, end + 1)
+        return [self.toc[i] for i in sorted(self.order[lo:hi])]
+
+    def chapter_ranges(self, page_count, level=1):
+        """(title, start, end) for each entry at `level`; an entry ends where the next entry
+        at the same or a higher level starts on a later page, or after one page if it starts on the same page"""
+        bounds = [(lvl, title, page - 1) for lvl, title, page in self.toc if lvl <= level]
+        ends = [page_count] * len(bounds)
+        # Single backward pass: the stack keeps later start pages, nearest on top, dropping those
+        # shadowed by an earlier entry that starts at or after them
+        stack = []
+        for i in range(len(bounds) - 1, -1, -1):
+            start = bounds[i][2]
+            while stack and stack[-1] < start:
+                stack.pop()
+            if stack:
+                ends[i] = start + 1 if stack[-1] == start else stack[-1]
+            stack.append(start)
+        return [(title, start, end) for (lvl, title, start), end in zip(bounds, ends) if lvl == level]
 
 class PDFChapterSplitter:
     def __init__(self, docname):
         self.docname = docname
         self.doc = p.open(docname)
         self.toc = self.get_pdf_toc()
+        self.toc_index = ToCIndex(self.toc)
 
     def get_pdf_toc(self):
         toc = self.doc.get_toc()
@@ -22,25 +143,12 @@ class PDFChapterSplitter:
         top_level_chapters = [entry for entry in self.toc if entry[0] == 1]
         return len(top_level_chapters), [entry[1] for entry in top_level_chapters]
 
-    def get_chapter_ranges(self, manual_ranges=None):
+    def get_chapter_ranges(self, manual_ranges=None, level=1):
         # manual_ranges: Optional dict {title: (start, end)}
-        chapters = [(title, page) for level, title, page in self.toc if level == 1]
         chapter_ranges = []
-        for i, (title, start_page) in enumerate(chapters):
+        for title, start_idx, end_idx in self.toc_index.chapter_ranges(len(self.doc), level=level):
             if manual_ranges and title in manual_ranges:
                 start_idx, end_idx = manual_ranges[title]
-            else:
-                start_idx = start_page - 1
-                end_idx = len(self.doc)
-                for j in range(i + 1, len(chapters)):
-                    next_start = chapters[j][1] - 1
-                    if next_start == start_idx:
-                        # If next chapter starts on the same page, current chapter is a single page
-                        end_idx = start_idx + 1
-                        break
-                    elif next_start > start_idx:
-                        end_idx = next_start
-                        break
             # Only add if range is valid
             if end_idx > start_idx:
                 chapter_ranges.append((title, start_idx, end_idx))
@@ -48,29 +156,95 @@ class PDFChapterSplitter:
                 chapter_ranges.append((title, start_idx, start_idx + 1))
         return chapter_ranges
 
-    def save_chapters(self, output_dir, output_widget=None, manual_ranges=None):
+    def get_chapter_toc(self, start, end):
+        # Levels are shifted so the slice starts at level 1 and never goes more than one level deeper per
+        # entry, as set_toc requires; a chapter split at level 2 would otherwise start at level 2
+        chapter_toc = []
+        for level, entry_title, page in self.toc_index.entries_between(start, end):
+            if not chapter_toc:
+                shift = level - 1
+            level = max(1, min(level - shift, chapter_toc[-1][0] + 1 if chapter_toc else 1))
+            chapter_toc.append([level, entry_title, page - start])
+        return chapter_toc
+
+    def get_chapter_jobs(self, output_dir, manual_ranges=None, level=1):
+        # Returns (start, end, chapter_toc, output_path) for every chapter
+        jobs = []
+        chapter_ranges = self.get_chapter_ranges(manual_ranges=manual_ranges, level=level)
+        stems = chapter_file_stems(title for title, _, _ in chapter_ranges)
+        for (title, start, end), stem in zip(chapter_ranges, stems):
+            output_path = os.path.join(output_dir, f"{stem}.pdf")
+            chapter_toc = self.get_chapter_toc(start, end)
+            jobs.append((start, end, chapter_toc, output_path))
+        return jobs
+
+    def save_chapters(self, output_dir, output_widget=None, manual_ranges=None, workers=1, level=1,
+                      optimize=False, subset_fonts=False, incremental=False):
+        # workers > 1 writes chapters in a process pool, each worker with its own handle on the source PDF
+        # optimize saves with garbage collection, object deduplication and compression (see OPTIMIZED_SAVE_OPTIONS)
+        # incremental skips chapters whose fingerprint matches the one recorded by the previous split
+        os.makedirs(output_dir, exist_ok=True)
+        jobs = self.get_chapter_jobs(output_dir, manual_ranges=manual_ranges, level=level)
+        old_fingerprints = load_fingerprints(output_dir) if incremental else {}
+        fingerprints = {}
+        pending = []
+        skipped = []
+        for job in jobs:
+            start, end, chapter_toc, output_path = job
+            name = os.path.basename(output_path)
+            fingerprints[name] = chapter_fingerprint(self.doc, start, end, chapter_toc, [optimize, subset_fonts])
+            if old_fingerprints.get(name) == fingerprints[name] and os.path.exists(output_path):
+                skipped.append(output_path)
+            else:
+                pending.append(job)
+        total_saved = 0
+        written = set()
+        try:
+            if workers > 1 and len(pending) > 1:
+                with ProcessPoolExecutor(max_workers=workers, initializer=_init_chapter_worker,
+                                         initargs=(self.docname,)) as pool:
+                    futures = [pool.submit(_write_chapter_job, *job, optimize, subset_fonts) for job in pending]
+                    for future in as_completed(futures):
+                        output_path, saved_bytes = future.result()
+                        written.add(os.path.basename(output_path))
+                        total_saved += saved_bytes or 0
+                        log_to_widget(output_widget, saved_message(output_path, saved_bytes))
+            else:
+                for start, end, chapter_toc, output_path in pending:
+                    saved_bytes = write_chapter(self.doc, start, end, chapter_toc, output_path, optimize, subset_fonts)
+                    written.add(os.path.basename(output_path))
+                    total_saved += saved_bytes or 0
+                    log_to_widget(output_widget, saved_message(output_path, saved_bytes))
+        finally:
+            # Record fingerprints only for chapters that are on disk and up to date
+            up_to_date = written | {os.path.basename(output_path) for output_path in skipped}
+            save_fingerprints(output_dir, {name: fp for name, fp in fingerprints.items() if name in up_to_date})
+        for output_path in skipped:
+            log_to_widget(output_widget, f"Skipped (unchanged): {output_path}\n")
+        log_to_widget(output_widget, f"Saved {len(pending)} chapters to '{output_dir}' folder.\n")
+        if skipped:
+            log_to_widget(output_widget, f"Skipped {len(skipped)} unchanged chapters.\n")
+        if optimize or subset_fonts:
+            log_to_widget(output_widget, f"Output optimization saved {total_saved / (1024 * 1024):.2f} MB in total.\n")
+        return skipped
+
+    def save_manifest(self, output_dir, output_widget=None, manual_ranges=None, level=1):
+        # Writes only a JSON index of chapter page ranges and ToC slices against this PDF, no chapter PDFs
         os.makedirs(output_dir, exist_ok=True)
-        chapter_ranges = self.get_chapter_ranges(manual_ranges=manual_ranges)
-        for idx, (title, start, end) in enumerate(chapter_ranges, 1):
-            title_clean = "".join(c if c.isalnum() else "_" for c in title)[:50]
-            output_path = os.path.join(output_dir, f"{title_clean}.pdf")
-            new_doc = p.open()
-            new_doc.insert_pdf(self.doc, from_page=start, to_page=end - 1)
-            chapter_toc = []
-            for entry in self.toc:
-                level, entry_title, page = entry
-                if start <= page - 1 < end:
-                    chapter_toc.append([level, entry_title, (page - start)])
-            if chapter_toc:
-                new_doc.set_toc(chapter_toc)
-            new_doc.save(output_path)
-            new_doc.close()
-            if output_widget:
-                output_widget.insert(tk.END, f"Saved: {output_path}\n")
-                output_widget.see(tk.END)
-        if output_widget:
-            output_widget.insert(tk.END, f"Saved {len(chapter_ranges)} chapters to '{output_dir}' folder.\n")
-            output_widget.see(tk.END)
+        chapters = []
+        chapter_ranges = self.get_chapter_ranges(manual_ranges=manual_ranges, level=level)
+        stems = chapter_file_stems(title for title, _, _ in chapter_ranges)
+        for (title, start, end), stem in zip(chapter_ranges, stems):
+            chapters.append({
+                "name": stem,
+                "title": title,
+                "start": start,
+                "end": end,
+                "toc": self.get_chapter_toc(start, end),
+            })
+        manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+        write_manifest(manifest_path, self.docname, len(self.doc), chapters)
+        log_to_widget(output_widget, f"Saved manifest of {len(chapters)} chapters: {manifest_path}\n")
 
 class PDFSplitterGUI:
     def __init__(self, root):
@@ -79,6 +253,11 @@ class PDFSplitterGUI:
         self.splitter = None
         self.pdf_path = tk.StringVar()
         self.outdir = tk.StringVar()
+        self.workers = tk.IntVar(value=1)
+        self.manifest_only = tk.BooleanVar(value=False)
+        self.optimize = tk.BooleanVar(value=False)
+        self.subset_fonts = tk.BooleanVar(value=False)
+        self.incremental = tk.BooleanVar(value=True)
 
         tk.Label(root, text="PDF Chapter Splitter", font=("Arial", 16, "bold")).pack(pady=5)
         frm1 = tk.Frame(root)
@@ -99,6 +278,12 @@ class PDFSplitterGUI:
         frm3.pack(fill=tk.X, padx=10)
         tk.Label(frm3, text="Output Folder:").pack(side=tk.LEFT)
         tk.Entry(frm3, textvariable=self.outdir, width=40, state='readonly').pack(side=tk.LEFT, padx=5)
+        tk.Label(frm3, text="Workers:").pack(side=tk.LEFT)
+        tk.Spinbox(frm3, from_=1, to=os.cpu_count() or 1, textvariable=self.workers, width=4).pack(side=tk.LEFT, padx=5)
+        tk.Checkbutton(frm3, text="Manifest only", variable=self.manifest_only).pack(side=tk.LEFT)
+        tk.Checkbutton(frm3, text="Optimize output", variable=self.optimize).pack(side=tk.LEFT)
+        tk.Checkbutton(frm3, text="Subset fonts", variable=self.subset_fonts).pack(side=tk.LEFT)
+        tk.Checkbutton(frm3, text="Skip unchanged", variable=self.incremental).pack(side=tk.LEFT)
 
         self.output = scrolledtext.ScrolledText(root, width=90, height=18, font=("Consolas", 10))
         self.output.pack(padx=10, pady=8)
@@ -154,7 +339,13 @@ class PDFSplitterGUI:
             outdir = self.outdir.get() or f"{os.path.splitext(os.path.basename(self.splitter.docname))[0]}_chapters"
             self.output.insert(tk.END, f"Saving chapters to: {outdir}\n")
             try:
-                self.splitter.save_chapters(outdir, output_widget=self.output, manual_ranges=self.manual_ranges)
+                if self.manifest_only.get():
+                    self.splitter.save_manifest(outdir, output_widget=self.output, manual_ranges=self.manual_ranges)
+                else:
+                    self.splitter.save_chapters(outdir, output_widget=self.output, manual_ranges=self.manual_ranges,
+                                               workers=self.workers.get(), optimize=self.optimize.get(),
+                                               subset_fonts=self.subset_fonts.get(),
+                                               incremental=self.incremental.get())
             except Exception as e:
                 self.output.insert(tk.END, f"Error: {e}\n")
         else:
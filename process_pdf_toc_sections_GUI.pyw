@@ -1,15 +1,28 @@
 import os
+import queue
 import threading
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import tkinter as tk
 from tkinter import filedialog, scrolledtext, messagebox
 import pymupdf as p
+from chapter_manifest import MANIFEST_NAME, ChapterView, load_manifest, open_chapter
+from page_blocks import extract_page_blocks, get_cached_page_blocks, sort_blocks
+from page_cache import DEFAULT_CACHE_PATH, PageCache, file_hash
+from section_dataset import SectionDatasetWriter
 
 class PDFBlockProcessor:
-    def __init__(self, pdf_path):
+    def __init__(self, pdf_path, doc=None, streaming=False, workers=1, cache=None):
+        # doc: optional already-open document or chapter_manifest.ChapterView to read instead of pdf_path
+        # streaming: don't load all blocks up front, read them page by page with iter_page_blocks
+        # workers > 1: extract all blocks with page-sharded worker processes (see page_blocks)
+        # cache: optional page_cache.PageCache for extracted blocks
         self.pdf_path = pdf_path
-        self.doc = p.open(pdf_path)
+        self.doc = doc if doc is not None else p.open(pdf_path)
+        self.workers = workers
+        self.cache = cache
         self.toc = self.get_pdf_toc()
-        self.all_blocks = self.get_all_blocks()
+        self.all_blocks = None if streaming else self.get_all_blocks()
 
     def get_pdf_toc(self):
         toc = self.doc.get_toc()
@@ -18,66 +31,290 @@ class PDFBlockProcessor:
         return toc
 
     def get_all_blocks(self):
+        # Also records self.page_starts: index of each page's first block, plus a final end sentinel
         all_blocks = []
-        for page in self.doc:
-            blocks = page.get_text("blocks")
-            blocks.sort(key=lambda b: (b[1], b[0]))
+        self.page_starts = []
+        if self.workers > 1 or self.cache is not None:
+            source, page_numbers = self.source_pages()
+            pages = extract_page_blocks(source, page_numbers, self.workers, self.cache)
+        else:
+            pages = (blocks for _, blocks in self.iter_page_blocks())
+        for blocks in pages:
+            self.page_starts.append(len(all_blocks))
             all_blocks.extend(blocks)
+        self.page_starts.append(len(all_blocks))
         return all_blocks
 
-    def group_blocks_by_toc(self):
-        toc_blocks = []
-        for toc_entry in self.toc:
-            _, title, _ = toc_entry
-            for idx, block in enumerate(self.all_blocks):
-                text = block[4].strip()
-                if text and text.replace('\n', ' ').startswith(title.split(' ', 1)[0]):
-                    toc_blocks.append((idx, title))
+    def source_pages(self):
+        """PDF file and 0-based page numbers in it that this processor reads"""
+        if isinstance(self.doc, ChapterView):
+            return self.doc.source, range(self.doc.start, self.doc.end)
+        return self.doc.name, range(len(self.doc))
+
+    def iter_page_blocks(self):
+        """Yield (page index, blocks sorted top-to-bottom) one page at a time"""
+        if self.cache is not None:
+            source, page_numbers = self.source_pages()
+            doc_hash = file_hash(source)
+            master_doc = self.doc.master_doc if isinstance(self.doc, ChapterView) else self.doc
+            for page_idx, page_num in enumerate(page_numbers):
+                yield page_idx, get_cached_page_blocks(master_doc, page_num, doc_hash, self.cache)
+            return
+        for page_idx, page in enumerate(self.doc):
+            yield page_idx, sort_blocks(page.get_text("blocks"))
+
+    @staticmethod
+    def heading_prefix(title):
+        return title.split(' ', 1)[0]
+
+    def heading_ranges(self, page_window):
+        """(first, last) 0-based pages searched for each ToC entry's heading: page_window pages around its ToC
+        page, extended up to the page before the next entry with a later ToC page, so a heading printed a few
+        pages after its ToC destination is still found (the last entries are searched to the end)"""
+        ranges = [None] * len(self.toc)
+        later_pages = []  # ToC pages after entry j, only those greater than every page between
+        for j in range(len(self.toc) - 1, -1, -1):
+            page = self.toc[j][2] - 1
+            while later_pages and later_pages[-1] <= page:
+                later_pages.pop()
+            next_page = later_pages[-1] if later_pages else float("inf")
+            ranges[j] = (page - page_window, max(page + page_window, next_page - 1))
+            later_pages.append(page)
+        return ranges
+
+    def heading_matcher(self, page_window=1):
+        """match(block text, page index) -> indices of the ToC entries whose heading is this block (usually
+        none or one). Both section writers use it, so batch and streaming output agree. Headings are matched
+        in ToC order: a block is the heading of the first pending entry whose range (heading_ranges) covers
+        its page and whose heading prefix starts the text; entries passed over are skipped. Entries are
+        looked up through a (length, prefix) index of the ToC, so a section number mentioned earlier in body
+        text, outside the entry's range, is not taken for the heading."""
+        prefixes = [self.heading_prefix(title) for _, title, _ in self.toc]
+        ranges = self.heading_ranges(page_window)
+        index = {}
+        for j, prefix in enumerate(prefixes):
+            index.setdefault((len(prefix), prefix), []).append(j)
+        lengths = sorted({len(prefix) for prefix in prefixes})
+        next_entry = 0
+
+        def match(text, page_idx):
+            nonlocal next_entry
+            text = text.strip().replace('\n', ' ')
+            matched = []
+            while text:
+                pending = [j for length in lengths if len(text) >= length
+                           for j in index.get((length, text[:length]), ())
+                           if j >= next_entry and ranges[j][0] <= page_idx <= ranges[j][1]]
+                if not pending:
                     break
-        toc_blocks.append((len(self.all_blocks), None))
+                matched.append(min(pending))
+                next_entry = matched[-1] + 1
+            return matched
+
+        return match
+
+    def group_blocks_by_toc(self, page_window=1):
+        match = self.heading_matcher(page_window)
+        toc_blocks = []
+        for page_idx in range(len(self.page_starts) - 1):
+            for idx in range(self.page_starts[page_idx], self.page_starts[page_idx + 1]):
+                for j in match(self.all_blocks[idx][4], page_idx):
+                    level, title, _ = self.toc[j]
+                    toc_blocks.append((idx, title, level))
+        toc_blocks.append((len(self.all_blocks), None, None))
 
         groups = []
         for i in range(len(toc_blocks) - 1):
-            start, title = toc_blocks[i]
-            end, _ = toc_blocks[i + 1]
+            start, title, level = toc_blocks[i]
+            end, _, _ = toc_blocks[i + 1]
             group = {
                 "toc_title": title,
+                "level": level,
+                "block_range": (start, end),
                 "blocks": self.all_blocks[start:end]
             }
             groups.append(group)
         return groups
 
+    def block_page(self, idx):
+        """0-based page of block idx in self.all_blocks"""
+        return bisect_right(self.page_starts, idx) - 1
+
 def sanitize_filename(name):
     return "".join(c if c.isalnum() or c in " ._-" else "_" for c in name).strip()
 
-def process_pdfs(input_folder, output_folder, log_callback):
-    if not os.path.isdir(input_folder):
-        log_callback(f"Input folder does not exist: {input_folder}\n")
-        return
-    os.makedirs(output_folder, exist_ok=True)
+def section_path(pdf_output_folder, i, toc_title):
+    safe_title = sanitize_filename(toc_title or f"section_{i}")
+    return os.path.join(pdf_output_folder, f"{i:02d}_{safe_title}.txt")
+
+def write_sections(processor, pdf_output_folder):
+    groups = processor.group_blocks_by_toc()
+    os.makedirs(pdf_output_folder, exist_ok=True)
+    for i, group in enumerate(groups, 1):
+        with open(section_path(pdf_output_folder, i, group['toc_title']), "w", encoding="utf-8") as f:
+            for block in group["blocks"]:
+                text = block[4].strip()
+                if text:
+                    f.write(text + "\n\n")
+
+def write_sections_streaming(processor, pdf_output_folder, page_window=1):
+    # Reads one page of blocks at a time and keeps only the current section file open; it is closed (flushed)
+    # as soon as the next ToC heading is found. Headings are matched as in batch mode (heading_matcher).
+    os.makedirs(pdf_output_folder, exist_ok=True)
+    match = processor.heading_matcher(page_window)
+    section = 0
+    f = None
+    try:
+        for page_idx, blocks in processor.iter_page_blocks():
+            for block in blocks:
+                for j in match(block[4], page_idx):
+                    if f:
+                        f.close()
+                    section += 1
+                    f = open(section_path(pdf_output_folder, section, processor.toc[j][1]), "w", encoding="utf-8")
+                text = block[4].strip()
+                if f and text:
+                    f.write(text + "\n\n")
+    finally:
+        if f:
+            f.close()
+
+def section_records(processor, doc_name):
+    # One section_dataset record per ToC section
+    records = []
+    for i, group in enumerate(processor.group_blocks_by_toc(), 1):
+        texts, bboxes, block_pages = [], [], []
+        start, end = group["block_range"]
+        for idx in range(start, end):
+            block = processor.all_blocks[idx]
+            text = block[4].strip()
+            if text:
+                texts.append(text)
+                bboxes.append([float(v) for v in block[:4]])
+                block_pages.append(processor.block_page(idx) + 1)
+        title = group["toc_title"]
+        records.append({
+            "doc": doc_name,
+            "section": i,
+            "section_number": processor.heading_prefix(title),
+            "title": title,
+            "level": group["level"],
+            "page_start": block_pages[0] if block_pages else None,
+            "page_end": block_pages[-1] if block_pages else None,
+            "bboxes": bboxes,
+            "block_pages": block_pages,
+            "text": "\n\n".join(texts),
+        })
+    return records
+
+def process_pdf(pdf_path, pdf_output_folder, doc=None, streaming=False, page_workers=1, cache=None, export=False):
+    # export: return section records for a section dataset instead of writing .txt files (never streamed)
+    processor = PDFBlockProcessor(pdf_path, doc=doc, streaming=streaming and not export, workers=page_workers,
+                                  cache=cache)
+    if export:
+        return section_records(processor, os.path.basename(pdf_output_folder))
+    if streaming:
+        write_sections_streaming(processor, pdf_output_folder)
+    else:
+        write_sections(processor, pdf_output_folder)
+
+def collect_jobs(input_folder, output_folder, log_callback):
+    # One job per PDF and per manifest chapter: (label, pdf or manifest path, chapter name or None, output folder)
+    jobs = []
     for filename in os.listdir(input_folder):
         if filename.lower().endswith(".pdf"):
-            pdf_path = os.path.join(input_folder, filename)
+            base_name = os.path.splitext(filename)[0]
+            jobs.append((filename, os.path.join(input_folder, filename), None, os.path.join(output_folder, base_name)))
+        elif filename == MANIFEST_NAME:
+            # Virtual chapters: each chapter is read as a page view of the master PDF
+            manifest_path = os.path.join(input_folder, filename)
             try:
-                log_callback(f"Processing: {filename}\n")
-                processor = PDFBlockProcessor(pdf_path)
-                groups = processor.group_blocks_by_toc()
-                base_name = os.path.splitext(filename)[0]
-                pdf_output_folder = os.path.join(output_folder, base_name)
-                os.makedirs(pdf_output_folder, exist_ok=True)
-                for i, group in enumerate(groups, 1):
-                    toc_title = group['toc_title'] or f"section_{i}"
-                    safe_title = sanitize_filename(toc_title)
-                    txt_filename = f"{i:02d}_{safe_title}.txt"
-                    txt_path = os.path.join(pdf_output_folder, txt_filename)
-                    with open(txt_path, "w", encoding="utf-8") as f:
-                        for block in group["blocks"]:
-                            text = block[4].strip()
-                            if text:
-                                f.write(text + "\n\n")
-                log_callback(f"Done: {filename}\n")
+                manifest = load_manifest(manifest_path)
             except Exception as e:
-                log_callback(f"Error processing {filename}: {e}\n")
+                log_callback(f"Error reading manifest {filename}: {e}\n")
+                continue
+            for chapter in manifest["chapters"]:
+                name = chapter["name"]
+                jobs.append((f"chapter {name}", manifest_path, name, os.path.join(output_folder, name)))
+    return jobs
+
+def run_job(job, streaming=False, page_workers=1, cache_path=None, export=False):
+    # Returns (page cache hits, misses, section records or None)
+    label, path, chapter_name, pdf_output_folder = job
+    doc = open_chapter(path, chapter_name) if chapter_name is not None else None
+    cache = PageCache(cache_path) if cache_path is not None else None
+    try:
+        records = process_pdf(path, pdf_output_folder, doc=doc, streaming=streaming, page_workers=page_workers,
+                              cache=cache, export=export)
+        if cache is None:
+            return 0, 0, records
+        return cache.hits, cache.misses, records
+    finally:
+        if cache is not None:
+            cache.close()
+        if doc is not None:
+            # open_chapter opened the master PDF for this job only
+            doc.master_doc.close()
+
+def process_pdfs(input_folder, output_folder, log_callback, streaming=False, workers=1, cache_path=None,
+                 export_path=None):
+    # workers > 1 converts several PDFs at once in a process pool, or shards the pages of a single PDF
+    # across workers; log_callback is only called from this thread
+    # cache_path: page_cache SQLite file to reuse extracted blocks across runs
+    # export_path: write all sections of the run to one .jsonl/.parquet dataset instead of .txt files
+    if not os.path.isdir(input_folder):
+        log_callback(f"Input folder does not exist: {input_folder}\n")
+        return
+    os.makedirs(output_folder, exist_ok=True)
+    jobs = collect_jobs(input_folder, output_folder, log_callback)
+    export = export_path is not None
+    try:
+        writer = SectionDatasetWriter(export_path) if export else None
+    except Exception as e:
+        # e.g. Parquet export without pyarrow; this runs on a worker thread, so report it in the log
+        log_callback(f"Cannot write {export_path}: {e}\n")
+        return
+    hits = misses = 0
+    try:
+        if workers > 1 and len(jobs) > 1:
+            log_callback(f"Processing {len(jobs)} files with {workers} workers...\n")
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = {pool.submit(run_job, job, streaming, 1, cache_path, export): job[0] for job in jobs}
+                for done, future in enumerate(as_completed(futures), 1):
+                    label = futures[future]
+                    try:
+                        job_hits, job_misses, records = future.result()
+                        hits += job_hits
+                        misses += job_misses
+                        if writer:
+                            writer.add_many(records)
+                        log_callback(f"Done: {label} ({done}/{len(jobs)})\n")
+                    except Exception as e:
+                        log_callback(f"Error processing {label}: {e}\n")
+        else:
+            for job in jobs:
+                label = job[0]
+                try:
+                    log_callback(f"Processing: {label}\n")
+                    job_hits, job_misses, records = run_job(job, streaming, workers, cache_path, export)
+                    hits += job_hits
+                    misses += job_misses
+                    if writer:
+                        writer.add_many(records)
+                    log_callback(f"Done: {label}\n")
+                except Exception as e:
+                    log_callback(f"Error processing {label}: {e}\n")
+    finally:
+        if writer:
+            writer.close()
+    if writer:
+        log_callback(f"Exported {writer.count} sections to {export_path}\n")
+    if cache_path is not None:
+        log_callback(f"Page cache: {hits} hits, {misses} misses\n")
+
+# Log messages from the worker thread go through a queue that the Tk main loop drains in batches
+LOG_POLL_MS = 100
+LOG_BATCH = 500
 
 class PDFToCExtractorGUI:
     def __init__(self, root):
@@ -85,7 +322,13 @@ class PDFToCExtractorGUI:
         self.root.title("PDF ToC Section Extractor")
         self.input_folder = tk.StringVar()
         self.output_folder = tk.StringVar()
+        self.streaming = tk.BooleanVar(value=False)
+        self.workers = tk.IntVar(value=1)
+        self.use_cache = tk.BooleanVar(value=False)
+        self.export_format = tk.StringVar(value="txt")
+        self.log_queue = queue.Queue()
         self.create_widgets()
+        self.root.after(LOG_POLL_MS, self.drain_log)
 
     def create_widgets(self):
         frm = tk.Frame(self.root)
@@ -99,7 +342,18 @@ class PDFToCExtractorGUI:
         tk.Entry(frm, textvariable=self.output_folder, width=50).grid(row=1, column=1)
         tk.Button(frm, text="Browse", command=self.browse_output).grid(row=1, column=2)
 
-        tk.Button(frm, text="Start Processing", command=self.start_processing).grid(row=2, column=0, columnspan=3, pady=10)
+        options_frm = tk.Frame(frm)
+        options_frm.grid(row=2, column=1, sticky=tk.W)
+        tk.Checkbutton(options_frm, text="Streaming (low memory)", variable=self.streaming).pack(side=tk.LEFT)
+        tk.Checkbutton(options_frm, text="Page cache", variable=self.use_cache).pack(side=tk.LEFT)
+        tk.Label(options_frm, text="Workers:").pack(side=tk.LEFT, padx=(10, 0))
+        tk.Spinbox(options_frm, from_=1, to=os.cpu_count() or 1, textvariable=self.workers, width=4).pack(side=tk.LEFT)
+        export_frm = tk.Frame(frm)
+        export_frm.grid(row=2, column=2)
+        tk.Label(export_frm, text="Output:").pack(side=tk.LEFT)
+        tk.OptionMenu(export_frm, self.export_format, "txt", "jsonl", "parquet").pack(side=tk.LEFT)
+
+        tk.Button(frm, text="Start Processing", command=self.start_processing).grid(row=3, column=0, columnspan=3, pady=10)
 
         self.log_text = scrolledtext.ScrolledText(self.root, width=80, height=20, state='disabled')
         self.log_text.pack(padx=10, pady=10, fill=tk.BOTH, expand=True)
@@ -115,10 +369,22 @@ class PDFToCExtractorGUI:
             self.output_folder.set(folder)
 
     def log(self, message):
-        self.log_text.configure(state='normal')
-        self.log_text.insert(tk.END, message)
-        self.log_text.see(tk.END)
-        self.log_text.configure(state='disabled')
+        # Safe to call from any thread
+        self.log_queue.put(message)
+
+    def drain_log(self):
+        messages = []
+        try:
+            while len(messages) < LOG_BATCH:
+                messages.append(self.log_queue.get_nowait())
+        except queue.Empty:
+            pass
+        if messages:
+            self.log_text.configure(state='normal')
+            self.log_text.insert(tk.END, "".join(messages))
+            self.log_text.see(tk.END)
+            self.log_text.configure(state='disabled')
+        self.root.after(LOG_POLL_MS, self.drain_log)
 
     def start_processing(self):
         input_folder = self.input_folder.get()
@@ -127,7 +393,12 @@ class PDFToCExtractorGUI:
             messagebox.showerror("Error", "Please select both input and output folders.")
             return
         self.log("Starting processing...\n")
-        thread = threading.Thread(target=process_pdfs, args=(input_folder, output_folder, self.log))
+        cache_path = DEFAULT_CACHE_PATH if self.use_cache.get() else None
+        export_format = self.export_format.get()
+        export_path = os.path.join(output_folder, f"sections.{export_format}") if export_format != "txt" else None
+        thread = threading.Thread(target=process_pdfs,
+                                  args=(input_folder, output_folder, self.log, self.streaming.get(), self.workers.get(),
+                                        cache_path, export_path))
         thread.start()
 
 if __name__ == "__main__":
@@ -0,0 +1,363 @@
+"""
+# register_table_extractor.py
+Register descriptions straight from pymupdf words and vector drawings, without camelot.
+Register tables in the at90can128-style manuals look like
+
+    Bit            7      6      5      4      3      2      1      0
+                   -      -      -      -    EERIE  EEMWE  EEWE   EERE   EECR
+    Read/Write     R      R      R      R     R/W    R/W    R/W    R/W
+    Initial Value  0      0      0      0      0      0      X      0
+
+(16-bit registers stack two name rows, a second bit number row and two Read/Write / Initial Value rows).
+- Words are grouped into rows by clustering their vertical centers with numpy.
+- Bit columns come from the bit numbers of the "Bit" row. Column boundaries are the vertical ruling lines
+  of the table, clustered with numpy, or the midpoints between bit numbers when the table has no rules.
+- A name row cell without a boundary between two bit columns (no ruling line at that row, or one word
+  spanning both columns) is a merged bit-field such as "CS02:0" and becomes one field over those bits.
+  Rules only decide this in rows they cross; Read/Write and Initial Value rows, usually unruled, are
+  split per bit column by word position, and a single value under a merged field applies to all its bits.
+- Addresses come from register summary lines "0x3F (0x5F) SREG ..." / "(0xD8) CANGCON ...".
+Output: register records {name, title, address, io_address, page, bits, reset, fields} with fields
+{name, msb, lsb, access, reset}, and flat bit records (bit_records) for CSV.
+Usage: python register_table_extractor.py file.pdf [--pages 1-5,9] [--json out.json] [--csv bits.csv]
+Dependencies:
+- pymupdf
+- numpy
+"""
+
+import argparse
+import csv
+import io
+import json
+import re
+import sys
+import time
+import numpy as np
+import pymupdf as p
+
+ROW_TOLERANCE = 3.0    # words whose vertical centers are this close (points) share a row
+RULE_TOLERANCE = 1.5   # ruling line coordinates this close are one line
+MAX_TABLE_ROWS = 10    # rows after the "Bit" row that can still belong to its table
+RESERVED = {"-", "–", "—", "−", "·"}
+ACCESS_VALUE = re.compile(r"^(R/W|R|W)$")
+RESET_VALUE = re.compile(r"^(0|1|X|N/A)$", re.IGNORECASE)
+SUMMARY_LINE = re.compile(r"(?:(0x[0-9A-Fa-f]{2,3})\s+)?\((0x[0-9A-Fa-f]{2,3})\)\s+([A-Z][A-Z0-9_]+)\b")
+HEADING = re.compile(r"^(.+?)\s+[–—-]\s+(.+)$")
+
+def cluster(values, tolerance):
+    """1-D clustering: values closer than tolerance to their sorted neighbour share a cluster.
+    Returns (cluster centers in ascending order, cluster label per input value)."""
+    values = np.asarray(values, dtype=float)
+    if not len(values):
+        return np.empty(0), np.empty(0, dtype=int)
+    order = np.argsort(values)
+    sorted_values = values[order]
+    sorted_labels = np.cumsum(np.concatenate(([True], np.diff(sorted_values) > tolerance))) - 1
+    labels = np.empty(len(values), dtype=int)
+    labels[order] = sorted_labels
+    centers = np.bincount(sorted_labels, weights=sorted_values) / np.bincount(sorted_labels)
+    return centers, labels
+
+def word_rows(words):
+    """[(y center, words sorted left to right), ...] top to bottom"""
+    if not words:
+        return []
+    centers, labels = cluster([(w[1] + w[3]) / 2 for w in words], ROW_TOLERANCE)
+    rows = [[] for _ in centers]
+    for word, label in zip(words, labels):
+        rows[label].append(word)
+    return [(y, sorted(row, key=lambda w: w[0])) for y, row in zip(centers, rows)]
+
+def row_text(row):
+    return " ".join(w[4] for w in row[1])
+
+def vertical_rules(page):
+    """Vertical ruling lines of the page as an array of (x, y0, y1): stroked lines, hairline rectangles
+    and the left/right edges of cell rectangles"""
+    rules = []
+    for drawing in page.get_drawings():
+        for item in drawing["items"]:
+            if item[0] == "l":
+                a, b = item[1], item[2]
+                if abs(a.x - b.x) < 1 and abs(a.y - b.y) > 1:
+                    rules.append(((a.x + b.x) / 2, min(a.y, b.y), max(a.y, b.y)))
+            elif item[0] == "re":
+                rect = item[1]
+                if rect.width < 2:
+                    rules.append(((rect.x0 + rect.x1) / 2, rect.y0, rect.y1))
+                elif rect.height >= 2:
+                    rules += [(rect.x0, rect.y0, rect.y1), (rect.x1, rect.y0, rect.y1)]
+    return np.array(rules, dtype=float).reshape(-1, 3)
+
+def is_bit_row(row):
+    words = row[1]
+    return len(words) >= 5 and words[0][4] == "Bit" and all(w[4].isdigit() for w in words[1:])
+
+def column_bounds(centers, rules, y0, y1):
+    """Boundaries of the bit columns (len(centers) + 1, ascending x) and whether the table is ruled.
+    Vertical rules spanning into [y0, y1] are clustered; between two bit centers the rule there is the
+    boundary, otherwise the midpoint is."""
+    pitch = float(np.median(np.diff(centers))) if len(centers) > 1 else 20.0
+    in_table = rules[(rules[:, 2] >= y0) & (rules[:, 1] <= y1)] if len(rules) else rules
+    rule_xs, _ = cluster(in_table[:, 0], RULE_TOLERANCE) if len(in_table) else (np.empty(0), None)
+    edges = np.concatenate(([centers[0] - pitch], centers, [centers[-1] + pitch]))
+    bounds, ruled = [], 0
+    for left, right in zip(edges[:-1], edges[1:]):
+        between = rule_xs[(rule_xs > left + 1) & (rule_xs < right - 1)]
+        if len(between):
+            # The rule nearest the midpoint separates the two columns
+            bounds.append(float(between[np.argmin(np.abs(between - (left + right) / 2))]))
+            ruled += 1
+        else:
+            bounds.append((left + right) / 2)
+    return np.array(bounds), ruled > len(centers) // 2
+
+def closed_bounds(bounds, row, rules, ruled):
+    """Per boundary: does it separate the cells of this row? In a ruled table, a row crossed by rules
+    needs a rule at the boundary; rows without rules (often the value rows) keep every boundary. In either
+    case a word crossing the boundary merges the two columns."""
+    y = row[0]
+    crossing = rules[(rules[:, 1] <= y + 1) & (rules[:, 2] >= y - 1), 0] if ruled and len(rules) else []
+    if len(crossing):
+        closed = np.array([bool(np.any(np.abs(crossing - b) <= RULE_TOLERANCE * 2)) for b in bounds])
+    else:
+        closed = np.ones(len(bounds), dtype=bool)
+    for w in row[1]:
+        closed &= ~((bounds > w[0] + 1) & (bounds < w[2] - 1))
+    return closed
+
+def row_cells(row, bounds, closed):
+    """[(first column, last column, text), ...] of the bit columns of a row, merged where not closed"""
+    cells, start = [], 0
+    for col in range(len(bounds) - 1):
+        if col == len(bounds) - 2 or closed[col + 1]:
+            cells.append((start, col))
+            start = col + 1
+    result = []
+    for first, last in cells:
+        lo, hi = bounds[first], bounds[last + 1]
+        text = " ".join(w[4] for w in row[1] if lo <= (w[0] + w[2]) / 2 < hi)
+        result.append((first, last, text))
+    return result
+
+def row_values(row, bounds):
+    """Value per bit column of a Read/Write or Initial Value row, by the position of each word's center"""
+    values = [""] * (len(bounds) - 1)
+    if row is None:
+        return values
+    for w in row[1]:
+        col = int(np.searchsorted(bounds, (w[0] + w[2]) / 2)) - 1
+        if 0 <= col < len(values):
+            values[col] = f"{values[col]} {w[4]}".strip()
+    return values
+
+def field_values(values, columns):
+    """Values of a field's columns; a single value printed for a merged field applies to all its bits"""
+    field = [values[col] for col in columns]
+    filled = [value for value in field if value]
+    return filled * len(field) if len(filled) == 1 else field
+
+def only_values(row, bounds, pattern):
+    """Row holds nothing but values matching pattern inside the bit columns (a continuation row)"""
+    return all(bounds[0] <= (w[0] + w[2]) / 2 < bounds[-1] and pattern.match(w[4]) for w in row[1])
+
+def split_table_rows(rows, bounds):
+    """Sort the rows after a "Bit" row into name rows, extra bit number rows, access and reset rows"""
+    names, numbers, access, reset = [], [], [], []
+    state = "names"
+    for row in rows:
+        label = row_text(row)
+        if is_bit_row(row):
+            break
+        if label.startswith("Read/Write"):
+            state = "access"
+            access.append(row)
+        elif label.startswith("Initial Value"):
+            state = "reset"
+            reset.append(row)
+        elif state == "names":
+            centers = [(w[0] + w[2]) / 2 for w in row[1]]
+            if any(x < bounds[0] for x in centers) or not any(x < bounds[-1] for x in centers):
+                # Text left of the bit columns or none inside them: not part of the table
+                break
+            if all(w[4].isdigit() for w in row[1]) and only_values(row, bounds, re.compile(r"^\d+$")):
+                numbers.append(row)
+            else:
+                names.append(row)
+        elif state == "access" and only_values(row, bounds, ACCESS_VALUE):
+            access.append(row)
+        elif state == "reset" and only_values(row, bounds, RESET_VALUE):
+            reset.append(row)
+        else:
+            break
+    return names, numbers, access, reset
+
+def row_bit_numbers(row, bounds):
+    """Bit number per column of a bit number row (None where missing)"""
+    numbers = [None] * (len(bounds) - 1)
+    for w in row[1]:
+        col = int(np.searchsorted(bounds, (w[0] + w[2]) / 2)) - 1
+        if 0 <= col < len(numbers) and w[4].isdigit():
+            numbers[col] = int(w[4])
+    return numbers
+
+def find_title(rows, bit_row_index, name):
+    """Nearest heading above the table naming the register: "EEPROM Control Register – EECR" -> title"""
+    for row in reversed(rows[max(0, bit_row_index - 8):bit_row_index]):
+        match = HEADING.match(row_text(row))
+        if not match:
+            continue
+        left, right = match.group(1), match.group(2)
+        if name in re.split(r"[\s,]+", right):
+            return left
+        if name in re.split(r"[\s,]+", left):
+            return right
+    return None
+
+def register_record(name_row, bit_numbers, access_row, reset_row, bounds, rules, ruled):
+    name_words = [w[4] for w in name_row[1] if (w[0] + w[2]) / 2 >= bounds[-1]]
+    cells = row_cells(name_row, bounds, closed_bounds(bounds, name_row, rules, ruled))
+    # Access and reset values are split per bit column, so a merged name field keeps per-bit values
+    access = row_values(access_row, bounds)
+    reset = row_values(reset_row, bounds)
+    fields = []
+    for first, last, text in cells:
+        bits = [bit_numbers[col] for col in range(first, last + 1) if bit_numbers[col] is not None]
+        if not bits:
+            continue
+        columns = range(first, last + 1)
+        field_access = sorted({value for value in field_values(access, columns) if value})
+        fields.append({
+            "name": None if text in RESERVED or not text else text,
+            "msb": max(bits),
+            "lsb": min(bits),
+            "access": "/".join(field_access) if len(field_access) != 1 else field_access[0],
+            # One character per bit, msb first; unknown or multi-character values ("N/A") become "?"
+            "reset": "".join(value if len(value) == 1 else "?" for value in field_values(reset, columns)),
+        })
+    fields.sort(key=lambda field: -field["msb"])
+    reset_bits = "".join(field["reset"] for field in fields)
+    return {
+        "name": " ".join(name_words) or None,
+        "bits": [max(field["msb"] for field in fields), min(field["lsb"] for field in fields)] if fields else None,
+        "reset": f"0x{int(reset_bits, 2):02X}" if reset_bits and set(reset_bits) <= {"0", "1"} else reset_bits,
+        "fields": fields,
+    }
+
+def page_registers(page, rows=None):
+    """Register records of one pymupdf page (without addresses)"""
+    rows = rows if rows is not None else word_rows(page.get_text("words"))
+    bit_rows = [i for i, row in enumerate(rows) if is_bit_row(row)]
+    if not bit_rows:
+        return []
+    rules = vertical_rules(page)
+    registers = []
+    for i in bit_rows:
+        bit_row = rows[i]
+        number_words = bit_row[1][1:]
+        centers = np.array([(w[0] + w[2]) / 2 for w in number_words])
+        table_rows = rows[i + 1:i + 1 + MAX_TABLE_ROWS]
+        y1 = table_rows[-1][0] if table_rows else bit_row[0]
+        bounds, ruled = column_bounds(centers, rules, bit_row[0] - ROW_TOLERANCE, y1 + ROW_TOLERANCE)
+        names, numbers, access, reset = split_table_rows(table_rows, bounds)
+        if not access and not reset:
+            continue
+        number_rows = [[int(w[4]) for w in number_words]] + [row_bit_numbers(row, bounds) for row in numbers]
+        for k, name_row in enumerate(names):
+            register = register_record(name_row, number_rows[min(k, len(number_rows) - 1)],
+                                       access[k] if k < len(access) else None,
+                                       reset[k] if k < len(reset) else None, bounds, rules, ruled)
+            if not register["fields"]:
+                continue
+            register["title"] = find_title(rows, i, register["name"]) if register["name"] else None
+            register["page"] = page.number + 1
+            registers.append(register)
+    return registers
+
+def summary_addresses(rows):
+    """{register name: (address, io_address or None)} from summary lines like "0x3F (0x5F) SREG ..." """
+    addresses = {}
+    for row in rows:
+        for match in SUMMARY_LINE.finditer(row_text(row)):
+            io_address, address, name = match.groups()
+            if name != "Reserved":
+                addresses.setdefault(name, (address, io_address))
+    return addresses
+
+def extract_registers(pdf_path, pages=None):
+    """Register records of the given 0-based pages (default all) with addresses from any summary
+    lines on those pages"""
+    registers, addresses = [], {}
+    with p.open(pdf_path) as doc:
+        for page_num in pages if pages is not None else range(doc.page_count):
+            page = doc[page_num]
+            rows = word_rows(page.get_text("words"))
+            for name, address in summary_addresses(rows).items():
+                addresses.setdefault(name, address)
+            registers.extend(page_registers(page, rows))
+    for register in registers:
+        register["address"], register["io_address"] = addresses.get(register["name"], (None, None))
+    return registers
+
+def bit_records(registers):
+    """One flat record per bit: register, address, bit, field, field bits, access, reset"""
+    records = []
+    for register in registers:
+        for field in register["fields"]:
+            for offset, bit in enumerate(range(field["msb"], field["lsb"] - 1, -1)):
+                records.append({
+                    "register": register["name"],
+                    "address": register["address"],
+                    "page": register["page"],
+                    "bit": bit,
+                    "field": field["name"],
+                    "field_bits": f"{field['msb']}:{field['lsb']}" if field["msb"] != field["lsb"] else str(bit),
+                    "access": field["access"],
+                    "reset": field["reset"][offset] if offset < len(field["reset"]) else "",
+                })
+    return records
+
+def parse_pages(pages_str):
+    """'1-3,5' -> [0, 1, 2, 4]"""
+    pages = []
+    for part in pages_str.split(","):
+        if "-" in part:
+            start, end = map(int, part.split("-"))
+            pages.extend(range(start - 1, end))
+        elif part.strip():
+            pages.append(int(part) - 1)
+    return pages
+
+def print_registers(registers):
+    for register in registers:
+        address = register["address"] or "?"
+        print(f"{register['name']} {address} (page {register['page']}) reset {register['reset']}"
+              + (f" - {register['title']}" if register["title"] else ""))
+        for field in register["fields"]:
+            bits = f"{field['msb']}:{field['lsb']}" if field["msb"] != field["lsb"] else str(field["msb"])
+            print(f"    [{bits}] {field['name'] or '-'} {field['access']} {field['reset']}")
+
+if __name__ == "__main__":
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    parser = argparse.ArgumentParser(description="Extract register descriptions from PDF register tables")
+    parser.add_argument("file")
+    parser.add_argument("--pages", help='1-based pages, e.g. "1-3,5" (default: all)')
+    parser.add_argument("--json", help="write register records to this JSON file")
+    parser.add_argument("--csv", help="write one row per bit to this CSV file")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    registers = extract_registers(args.file, parse_pages(args.pages) if args.pages else None)
+    elapsed = time.perf_counter() - start
+    print_registers(registers)
+    print(f"{len(registers)} register(s) in {elapsed:.3f} s")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(registers, f, indent=1, ensure_ascii=False)
+    if args.csv:
+        records = bit_records(registers)
+        with open(args.csv, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=["register", "address", "page", "bit", "field", "field_bits",
+                                                   "access", "reset"])
+            writer.writeheader()
+            writer.writerows(records)
@@ -0,0 +1,103 @@
+"""
+# section_dataset.py
+Columnar export of ToC sections: one dataset per run instead of one small .txt file per section.
+Each record is one section:
+- doc, section (1-based order in the doc), section_number (first token of the ToC title), title, level
+- page_start, page_end: 1-based pages of the section's first and last block
+- bboxes, block_pages: [x0, y0, x1, y1] and page of every non-empty block
+- text: the block texts joined by blank lines, as in the .txt export
+Formats: JSONL (stdlib) or Parquet (needs pyarrow). Records are appended in batches; read_sections
+memory-maps the file for downstream consumers.
+"""
+
+import json
+import mmap
+import os
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("Parquet export needs pyarrow (pip install pyarrow)")
+
+def section_schema():
+    _require_pyarrow()
+    return pa.schema([
+        ("doc", pa.string()),
+        ("section", pa.int32()),
+        ("section_number", pa.string()),
+        ("title", pa.string()),
+        ("level", pa.int32()),
+        ("page_start", pa.int32()),
+        ("page_end", pa.int32()),
+        ("bboxes", pa.list_(pa.list_(pa.float64()))),
+        ("block_pages", pa.list_(pa.int32())),
+        ("text", pa.string()),
+    ])
+
+def dataset_format(path):
+    return "parquet" if path.lower().endswith(".parquet") else "jsonl"
+
+class SectionDatasetWriter:
+    def __init__(self, path, batch_size=1000):
+        self.path = path
+        self.format = dataset_format(path)
+        self.batch_size = batch_size
+        self.batch = []
+        self.count = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if self.format == "parquet":
+            self.schema = section_schema()
+            self.writer = pq.ParquetWriter(path, self.schema)
+        else:
+            self.writer = open(path, "w", encoding="utf-8")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add(self, record):
+        self.batch.append(record)
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def add_many(self, records):
+        for record in records:
+            self.add(record)
+
+    def flush(self):
+        if not self.batch:
+            return
+        if self.format == "parquet":
+            # One row group per batch
+            self.writer.write_table(pa.Table.from_pylist(self.batch, schema=self.schema))
+        else:
+            self.writer.write("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in self.batch))
+            self.writer.flush()
+        self.count += len(self.batch)
+        self.batch = []
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+def read_sections(path):
+    """Parquet: a pyarrow Table backed by a memory map. JSONL: a generator of records read from a memory map."""
+    if dataset_format(path) == "parquet":
+        _require_pyarrow()
+        return pq.read_table(path, memory_map=True)
+    return _iter_jsonl(path)
+
+def _iter_jsonl(path):
+    if os.path.getsize(path) == 0:
+        return
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for line in iter(mm.readline, b""):
+            if line.strip():
+                yield json.loads(line)
@@ -0,0 +1,193 @@
+"""
+# table_caption_index.py
+Corpus-wide index of table captions, built on the caption scanner in table_extractor_pattern_matching.
+Every caption is stored once with its document, page, label ("Table 25-3"), text, bbox and the rows of the
+table paired with it, so lookups never go back to pdfplumber. An inverted token index over caption text and
+table cells answers queries like "EECR" or "fuse low byte" with one indexed SQL query.
+The index is incremental: documents are keyed by path and content hash, so re-running `add` on a folder
+only scans new or changed PDFs.
+Usage:
+  python table_caption_index.py add file.pdf|folder ... [--index FILE] [--prefilter] [--workers N]
+  python table_caption_index.py query "Table 25-3" [--index FILE] [--rows]
+  python table_caption_index.py query EECR [--captions-only]
+"""
+
+import argparse
+import io
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+from page_cache import file_hash
+from table_extractor_pattern_matching import CAPTION_LABEL, caption_label, caption_table_pairs, scan_pdf
+
+DEFAULT_INDEX_PATH = "table_captions.sqlite"
+TOKEN = re.compile(r"\w+")
+
+def tokenize(text):
+    return {token.lower() for token in TOKEN.findall(text or "")}
+
+def table_tokens(rows):
+    tokens = set()
+    for row in rows or []:
+        for cell in row:
+            tokens |= tokenize(cell)
+    return tokens
+
+def find_pdfs(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for filename in sorted(files):
+                    if filename.lower().endswith(".pdf"):
+                        yield os.path.join(root, filename)
+        else:
+            yield path
+
+class CaptionIndex:
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(
+            "CREATE TABLE IF NOT EXISTS docs ("
+            " id INTEGER PRIMARY KEY, path TEXT UNIQUE, hash TEXT, indexed_at REAL);"
+            "CREATE TABLE IF NOT EXISTS captions ("
+            " id INTEGER PRIMARY KEY, doc_id INTEGER REFERENCES docs(id) ON DELETE CASCADE,"
+            " page INTEGER, label TEXT, text TEXT, bbox TEXT, position TEXT, table_bbox TEXT, table_rows TEXT);"
+            "CREATE INDEX IF NOT EXISTS captions_label ON captions (label COLLATE NOCASE);"
+            # field: 'caption' for caption text tokens, 'cell' for table cell tokens
+            "CREATE TABLE IF NOT EXISTS tokens ("
+            " token TEXT, caption_id INTEGER REFERENCES captions(id) ON DELETE CASCADE, field TEXT,"
+            " PRIMARY KEY (token, field, caption_id)) WITHOUT ROWID;"
+            "CREATE INDEX IF NOT EXISTS tokens_caption ON tokens (caption_id);")
+        self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def is_current(self, pdf_path):
+        row = self.conn.execute("SELECT hash FROM docs WHERE path = ?", (os.path.abspath(pdf_path),)).fetchone()
+        return row is not None and row[0] == file_hash(pdf_path)
+
+    def add_result(self, pdf_path, result):
+        """Replace the entries of pdf_path with the captions of a scan_pdf result"""
+        path = os.path.abspath(pdf_path)
+        with self.conn:
+            self.conn.execute("DELETE FROM docs WHERE path = ?", (path,))
+            doc_id = self.conn.execute("INSERT INTO docs (path, hash, indexed_at) VALUES (?, ?, ?)",
+                                       (path, file_hash(pdf_path), time.time())).lastrowid
+            paired = {id(caption): (table, position)
+                      for caption, table, position in caption_table_pairs(result["captions"], result["tables"])}
+            for caption in result["captions"]:
+                table, position = paired.get(id(caption), (None, None))
+                caption_id = self.conn.execute(
+                    "INSERT INTO captions (doc_id, page, label, text, bbox, position, table_bbox, table_rows)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (doc_id, caption["page"], caption_label(caption["text"]), caption["text"],
+                     json.dumps(caption["bbox"]), position,
+                     json.dumps(table["bbox"]) if table else None,
+                     json.dumps(table["rows"], ensure_ascii=False) if table else None)).lastrowid
+                rows = [(token, caption_id, "caption") for token in tokenize(caption["text"])]
+                if table:
+                    rows += [(token, caption_id, "cell") for token in table_tokens(table["rows"])]
+                self.conn.executemany("INSERT OR IGNORE INTO tokens VALUES (?, ?, ?)", rows)
+        return doc_id
+
+    def add(self, pdf_path, force=False, **scan_options):
+        """Scan and index one PDF unless it is already indexed with the same content. Returns True if scanned."""
+        if not force and self.is_current(pdf_path):
+            return False
+        self.add_result(pdf_path, scan_pdf(pdf_path, **scan_options))
+        return True
+
+    def remove(self, pdf_path):
+        with self.conn:
+            self.conn.execute("DELETE FROM docs WHERE path = ?", (os.path.abspath(pdf_path),))
+
+    def _select(self, where, params):
+        rows = self.conn.execute(
+            "SELECT docs.path, captions.page, captions.label, captions.text, captions.bbox, captions.position,"
+            " captions.table_bbox, captions.table_rows FROM captions JOIN docs ON docs.id = captions.doc_id"
+            f" WHERE {where} ORDER BY docs.path, captions.page, captions.id", params).fetchall()
+        return [{"doc": doc, "page": page, "label": label, "text": text, "bbox": json.loads(bbox),
+                 "position": position, "table_bbox": json.loads(table_bbox) if table_bbox else None,
+                 "rows": json.loads(table_rows) if table_rows else None}
+                for doc, page, label, text, bbox, position, table_bbox, table_rows in rows]
+
+    def lookup_label(self, label):
+        """Captions with this label ("Table 25-3", case-insensitive) across all documents"""
+        return self._select("captions.label = ? COLLATE NOCASE", (caption_label(label),))
+
+    def search(self, text, captions_only=False):
+        """Captions whose caption text (and table cells, unless captions_only) contain every token of text"""
+        tokens = sorted(tokenize(text))
+        if not tokens:
+            return []
+        fields = "('caption')" if captions_only else "('caption', 'cell')"
+        where = (f"captions.id IN (SELECT caption_id FROM tokens WHERE field IN {fields}"
+                 f" AND token IN ({','.join('?' * len(tokens))}) GROUP BY caption_id"
+                 " HAVING COUNT(DISTINCT token) = ?)")
+        return self._select(where, (*tokens, len(tokens)))
+
+    def query(self, text, captions_only=False):
+        """Label lookup for "Table N-M", token search for anything else"""
+        if CAPTION_LABEL.fullmatch(text.strip()):
+            return self.lookup_label(text)
+        return self.search(text, captions_only)
+
+    def stats(self):
+        docs, = self.conn.execute("SELECT COUNT(*) FROM docs").fetchone()
+        captions, tables = self.conn.execute(
+            "SELECT COUNT(*), COUNT(table_rows) FROM captions").fetchone()
+        tokens, = self.conn.execute("SELECT COUNT(DISTINCT token) FROM tokens").fetchone()
+        return {"docs": docs, "captions": captions, "tables": tables, "tokens": tokens}
+
+    def close(self):
+        self.conn.close()
+
+def print_hits(hits, show_rows=False):
+    for hit in hits:
+        table = f"table {hit['position']}" if hit["rows"] is not None else "no table"
+        print(f"{hit['doc']} p.{hit['page']}: {hit['text']} ({table})")
+        if show_rows and hit["rows"]:
+            for row in hit["rows"]:
+                if row:
+                    print("    " + " | ".join(cell if cell else "" for cell in row))
+
+if __name__ == "__main__":
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    parser = argparse.ArgumentParser(description="Index table captions of PDFs and look them up")
+    parser.add_argument("--index", default=DEFAULT_INDEX_PATH, help="SQLite index file")
+    commands = parser.add_subparsers(dest="command", required=True)
+    add_parser = commands.add_parser("add", help="scan new or changed PDFs into the index")
+    add_parser.add_argument("paths", nargs="+", help="PDF files or folders")
+    add_parser.add_argument("--pattern", help="caption regex (case-insensitive)")
+    add_parser.add_argument("--prefilter", action="store_true")
+    add_parser.add_argument("--workers", type=int, default=1)
+    add_parser.add_argument("--force", action="store_true", help="re-scan PDFs that are already indexed")
+    query_parser = commands.add_parser("query", help='"Table 25-3" or words to find in captions and cells')
+    query_parser.add_argument("text")
+    query_parser.add_argument("--captions-only", action="store_true", help="do not search table cells")
+    query_parser.add_argument("--rows", action="store_true", help="print the table rows")
+    args = parser.parse_args()
+
+    with CaptionIndex(args.index) as index:
+        if args.command == "add":
+            scan_options = {"prefilter": args.prefilter, "workers": args.workers}
+            if args.pattern:
+                scan_options["pattern"] = args.pattern
+            for pdf_path in find_pdfs(args.paths):
+                scanned = index.add(pdf_path, force=args.force, **scan_options)
+                print(f"{'Indexed' if scanned else 'Up to date'}: {pdf_path}")
+            print(index.stats())
+        else:
+            start = time.perf_counter()
+            hits = index.query(args.text, args.captions_only)
+            print_hits(hits, args.rows)
+            print(f"{len(hits)} hit(s) in {(time.perf_counter() - start) * 1000:.1f} ms")
@@ -1,75 +1,282 @@
 """
 # table_extractor.py
-This script extracts and prints table captions and table data from a PDF document, specifically targeting lines that match the pattern for table captions (e.g., "Table 3-1. ...") in the AT90CAN128 reference manual. It uses the `pdfplumber` library to process the PDF, extract text and tables from each page, and print relevant information. The script also summarizes the total number of table captions and tables found, and lists all matched table caption lines with their corresponding page numbers.
+This script extracts and prints table captions and table data from PDF documents, specifically targeting lines that match the pattern for table captions (e.g., "Table 3-1. ...") in the AT90CAN128 reference manual. It uses the `pdfplumber` library to process the PDF, extract text and tables from each page, and print relevant information. The script also summarizes the total number of table captions and tables found, and lists all matched table caption lines with their corresponding page numbers.
 Key functionalities:
-- Searches for lines matching the table caption pattern using regular expressions.
-- Extracts and prints table data from pages containing matched captions.
-- Provides a summary of the total lines and tables found.
-- Lists all matched table caption lines with page references.
+- scan_pdf / scan_pdfs: one pass per PDF (each page's text is extracted once) returning captions, caption pages and tables.
+- Optional two-tier scan (--prefilter): a fast pymupdf text pass finds candidate caption pages, and only those
+  go to pdfplumber's extract_text/extract_tables, spread over --workers processes. Timings are reported per tier.
+- Searches for lines matching a configurable table caption pattern using regular expressions.
+- Extracts table data from pages containing matched captions.
+- caption_tables: each caption paired with the nearest table above or below it on its page (pdfplumber
+  line and table bboxes), keyed by label ("Table 25-3"), with rows of continued tables merged. --map FILE
+  writes it as JSON.
+- Optional page_cache.PageCache so re-scans of an unchanged PDF skip pdfplumber.
+- print_report prints the captions, tables and summary of a scan result.
+Usage: python table_extractor_pattern_matching.py [--pattern REGEX] [--prefilter] [--workers N] [--map FILE] file.pdf [file.pdf ...]
 Dependencies:
 - pdfplumber
+- pymupdf
 - re
 - sys
 - io
 """
 
-import pdfplumber
+import argparse
+import io
+import json
 import re
 import sys
-import io
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
-docname = "at90can128_rm.pdf"
-docname = r"C:\Users\E40065689\Desktop\pdf_parse\at90can128_rm.pdf_chapters\4__Memories.pdf"
-docname = r"C:\Users\E40065689\Desktop\pdf_parse\at90can128_rm.pdf_chapters\25__Memory_Programming.pdf"
-#docname = "C:/Users/E40065689/Downloads/LS10xxARM.pdf"
-
-pattern = re.compile(r"^\s*table\s+\d+-\d+\..+", re.IGNORECASE)
-
-with pdfplumber.open(docname) as pdf:
-    total_tables = 0
-    total_lines_found = 0
-    for page_num, page in enumerate(pdf.pages):
-        text = page.extract_text() or ""
-        lines = text.splitlines()
-        found_lines = [l for l in lines if pattern.search(l)]
-        
-        if found_lines:
-            #print(f"\nPage {page_num + 1}: Found lines with 'Table ':")
-            for fl in found_lines:
-                print(f"  {fl}")
-            total_lines_found += len(found_lines)
-        
-            tables = page.extract_tables()
-            if tables:
-                #print(f"  Extracted {len(tables)} tables:")
-                total_tables += len(tables)
-                for table in tables:
-                    for row in table:
-                        if row:
-                            print(' | '.join(cell if cell else '' for cell in row))
+import time
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ProcessPoolExecutor
+import pdfplumber
+import pymupdf as p
+from page_blocks import blocks_to_text, extract_page_blocks, shard_pages
+from page_cache import file_hash
+
+DEFAULT_CAPTION_PATTERN = r"^\s*table\s+\d+-\d+\..+"
+TEXT_EXTRACTOR = "pdfplumber.text"
+TABLES_EXTRACTOR = "pdfplumber.tables_bbox"
+
+def compile_caption_pattern(pattern=DEFAULT_CAPTION_PATTERN):
+    if isinstance(pattern, re.Pattern):
+        return pattern
+    return re.compile(pattern, re.IGNORECASE)
+
+# Tier 1 of the prefiltered scan: a looser, unanchored caption search over pymupdf page text, so a caption
+# split differently into lines by pymupdf than by pdfplumber still marks its page as a candidate
+DEFAULT_PREFILTER_PATTERN = r"table\s+\d+-\d+\."
+
+def caption_lines(text, pattern):
+    return [l for l in text.splitlines() if pattern.search(l)]
+
+def prefilter_pages(docname, prefilter_pattern=DEFAULT_PREFILTER_PATTERN, workers=1, cache=None):
+    """0-based pages whose pymupdf text matches prefilter_pattern anywhere"""
+    prefilter_pattern = compile_caption_pattern(prefilter_pattern)
+    page_blocks = extract_page_blocks(docname, workers=workers, cache=cache)
+    return [page_num for page_num, blocks in enumerate(page_blocks) if prefilter_pattern.search(blocks_to_text(blocks))]
+
+def caption_boxes(page, pattern):
+    """(top, bottom, x0, x1, text) of every pdfplumber text line (built from words) matching the caption pattern"""
+    return [(line["top"], line["bottom"], line["x0"], line["x1"], line["text"])
+            for line in page.extract_text_lines() if pattern.search(line["text"])]
+
+def _scan_shard(docname, page_numbers, pattern, extract_tables):
+    # pdfplumber text of every page; tables (rows + bbox) and caption line boxes only of pages with a caption
+    results = []
+    with pdfplumber.open(docname) as pdf:
+        for page_num in page_numbers:
+            page = pdf.pages[page_num]
+            text = page.extract_text() or ""
+            tables = None
+            if extract_tables and caption_lines(text, pattern):
+                tables = {
+                    "captions": caption_boxes(page, pattern),
+                    "tables": [{"bbox": list(table.bbox), "rows": table.extract()} for table in page.find_tables()],
+                }
+            results.append((page_num, text, tables))
+    return results
+
+def scan_pages(docname, page_numbers, pattern, extract_tables=True, cache=None, workers=1):
+    """{page_num: (text, {"captions", "tables"} or None)} for 0-based page_numbers, through the cache and over `workers` processes"""
+    doc_hash = file_hash(docname) if cache is not None else None
+    # The caption boxes depend on the caption pattern, the page text does not
+    tables_options = {"pattern": pattern.pattern, "flags": pattern.flags}
+    texts, tables = {}, {}
+    if cache is not None:
+        texts = cache.get_many(doc_hash, page_numbers, TEXT_EXTRACTOR)
+        if extract_tables:
+            caption_pages = [page_num for page_num, text in texts.items() if caption_lines(text, pattern)]
+            tables = cache.get_many(doc_hash, caption_pages, TABLES_EXTRACTOR, tables_options)
+    todo = [page_num for page_num in page_numbers if page_num not in texts
+            or (extract_tables and page_num not in tables and caption_lines(texts[page_num], pattern))]
+    if workers > 1 and len(todo) > 1:
+        shards = shard_pages(todo, workers)
+        computed = []
+        with ProcessPoolExecutor(max_workers=len(shards)) as pool:
+            for shard_results in pool.map(_scan_shard, [docname] * len(shards), shards, [pattern] * len(shards),
+                                          [extract_tables] * len(shards)):
+                computed.extend(shard_results)
+    else:
+        computed = _scan_shard(docname, todo, pattern, extract_tables) if todo else []
+    for page_num, text, page_tables in computed:
+        texts[page_num] = text
+        if page_tables is not None:
+            tables[page_num] = page_tables
+    if cache is not None and computed:
+        cache.put_many(doc_hash, {page_num: text for page_num, text, _ in computed}, TEXT_EXTRACTOR)
+        cache.put_many(doc_hash, {page_num: page_tables for page_num, _, page_tables in computed
+                                  if page_tables is not None}, TABLES_EXTRACTOR, tables_options)
+    return {page_num: (texts[page_num], tables.get(page_num)) for page_num in page_numbers}
 
+def scan_pdf(docname, pattern=DEFAULT_CAPTION_PATTERN, extract_tables=True, cache=None, prefilter=False,
+             workers=1, prefilter_pattern=DEFAULT_PREFILTER_PATTERN):
+    """Scan one PDF, extracting each page's text once. Returns
+    {"doc", "captions": [{"page", "text"}], "pages": [1-based caption pages], "tables": [{"page", "rows"}],
+     "caption_tables": caption_table_map(...), "timings": {tier: seconds}}
+    prefilter: only pages whose pymupdf text matches prefilter_pattern go to pdfplumber (two-tier scan)
+    workers: pdfplumber pages (and tier 1 pymupdf pages) are spread over this many processes"""
+    pattern = compile_caption_pattern(pattern)
+    timings = {}
+    start = time.perf_counter()
+    if prefilter:
+        page_numbers = prefilter_pages(docname, prefilter_pattern, workers, cache)
+        timings["pymupdf prefilter"] = time.perf_counter() - start
+    else:
+        # pymupdf reads the page count from the page tree; pdfplumber would parse the whole PDF for it
+        with p.open(docname) as doc:
+            page_numbers = list(range(doc.page_count))
+    start = time.perf_counter()
+    pages = scan_pages(docname, page_numbers, pattern, extract_tables, cache, workers)
+    timings["pdfplumber text + tables"] = time.perf_counter() - start
+
+    result = {"doc": docname, "captions": [], "pages": [], "tables": [], "timings": timings}
+    for page_num in page_numbers:
+        text, tables = pages[page_num]
+        found_lines = caption_lines(text, pattern)
+        if not found_lines:
+            continue
+        result["pages"].append(page_num + 1)
+        boxes = {}
+        if extract_tables:
+            for top, bottom, x0, x1, line in tables["captions"]:
+                boxes.setdefault(line, []).append([x0, top, x1, bottom])
+        result["captions"].extend({"page": page_num + 1, "text": fl,
+                                   "bbox": boxes[fl].pop(0) if boxes.get(fl) else None} for fl in found_lines)
+        if extract_tables:
+            result["tables"].extend({"page": page_num + 1, "bbox": table["bbox"], "rows": table["rows"]}
+                                    for table in tables["tables"])
+    if extract_tables:
+        result["caption_tables"] = caption_table_map(result["captions"], result["tables"])
+    return result
+
+def scan_pdfs(docnames, pattern=DEFAULT_CAPTION_PATTERN, extract_tables=True, cache=None, prefilter=False,
+              workers=1, prefilter_pattern=DEFAULT_PREFILTER_PATTERN):
+    pattern = compile_caption_pattern(pattern)
+    return [scan_pdf(docname, pattern, extract_tables, cache, prefilter, workers, prefilter_pattern)
+            for docname in docnames]
+
+CAPTION_LABEL = re.compile(r"table\s+(\d+-\d+)", re.IGNORECASE)
+
+def caption_label(text):
+    """"Table 25-3" for "Table 25-3. Lock Bit Byte", else the stripped caption text"""
+    match = CAPTION_LABEL.search(text)
+    return f"Table {match.group(1)}" if match else text.strip()
+
+def pair_captions(captions, tables, max_gap=None):
+    """Pair the captions and tables of one page by vertical distance (bboxes are [x0, top, x1, bottom]).
+    Tables are indexed by top and by bottom, so each caption finds the nearest table below and above it
+    with a bisect; the candidate pairs are then taken greedily, nearest first, one table per caption.
+    Returns {caption index: (table index, "below" | "above")}"""
+    by_top = sorted(range(len(tables)), key=lambda t: tables[t][1])
+    tops = [tables[t][1] for t in by_top]
+    by_bottom = sorted(range(len(tables)), key=lambda t: tables[t][3])
+    bottoms = [tables[t][3] for t in by_bottom]
+    candidates = []
+    for c, (_, top, _, bottom) in enumerate(captions):
+        i = bisect_left(tops, bottom)
+        if i < len(tops):
+            # Ties go to the table below: captions normally sit above their table
+            candidates.append((tops[i] - bottom, 0, c, by_top[i]))
+        i = bisect_right(bottoms, top) - 1
+        if i >= 0:
+            candidates.append((top - bottoms[i], 1, c, by_bottom[i]))
+    candidates.sort()
+    pairs, used_tables = {}, set()
+    for gap, side, c, t in candidates:
+        if c in pairs or t in used_tables or (max_gap is not None and gap > max_gap):
+            continue
+        pairs[c] = (t, "above" if side else "below")
+        used_tables.add(t)
+    return pairs
+
+def caption_table_pairs(captions, tables, max_gap=None):
+    """Yield (caption, table, position of the table relative to the caption) for every caption of a scan
+    result paired with a table on its page, in page order. Captions without a bbox are skipped."""
+    captions_by_page, tables_by_page = {}, {}
+    for caption in captions:
+        if caption["bbox"] is not None:
+            captions_by_page.setdefault(caption["page"], []).append(caption)
+    for table in tables:
+        tables_by_page.setdefault(table["page"], []).append(table)
+    for page in sorted(captions_by_page):
+        page_captions = captions_by_page[page]
+        page_tables = tables_by_page.get(page, [])
+        pairs = pair_captions([c["bbox"] for c in page_captions], [t["bbox"] for t in page_tables], max_gap)
+        for c, (t, position) in sorted(pairs.items()):
+            yield page_captions[c], page_tables[t], position
+
+def caption_table_map(captions, tables, max_gap=None):
+    """caption label -> {"caption", "pages", "position" (of the table relative to the caption), "bboxes", "rows"}
+    for every caption paired with a table on its page. A label seen again on a later page (a continued table)
+    gets that table's rows appended. Captions without a bbox or without a table nearby are left out."""
+    mapping = {}
+    for caption, table, position in caption_table_pairs(captions, tables, max_gap):
+        label = caption_label(caption["text"])
+        if label in mapping:
+            entry = mapping[label]
+            entry["pages"].append(caption["page"])
+            entry["bboxes"].append(table["bbox"])
+            entry["rows"].extend(table["rows"])
+        else:
+            mapping[label] = {"caption": caption["text"], "pages": [caption["page"]], "position": position,
+                              "bboxes": [table["bbox"]], "rows": list(table["rows"])}
+    return mapping
+
+def print_report(result):
+    captions_by_page = {}
+    for caption in result["captions"]:
+        captions_by_page.setdefault(caption["page"], []).append(caption["text"])
+    tables_by_page = {}
+    for table in result["tables"]:
+        tables_by_page.setdefault(table["page"], []).append(table["rows"])
+    for page in result["pages"]:
+        #print(f"\nPage {page}: Found lines with 'Table ':")
+        for fl in captions_by_page[page]:
+            print(f"  {fl}")
+        for table in tables_by_page.get(page, []):
+            for row in table:
+                if row:
+                    print(' | '.join(cell if cell else '' for cell in row))
+
+    total_lines_found = len(result["captions"])
     print("  Total lines found with 'Table': ", total_lines_found)
-    print(f"\n Total tables extracted: {total_tables}")
+    print(f"\n Total tables extracted: {len(result['tables'])}")
     print("\nSummary:")
-    print(f"Processed document: {docname}")
+    print(f"Processed document: {result['doc']}")
     print(f"Total lines found with 'Table': {total_lines_found}")
     print("Lines found:")
-    with pdfplumber.open(docname) as pdf:
-        for page_num, page in enumerate(pdf.pages):
-            text = page.extract_text() or ""
-            lines = text.splitlines()
-            found_lines = [l for l in lines if pattern.search(l)]
-            for fl in found_lines:
-                print(f"Page {page_num + 1}: {fl}")
-
-# print as python list the page numbers where the table caption lines are found
-page_numbers = []
-with pdfplumber.open(docname) as pdf:
-    for page_num, page in enumerate(pdf.pages):
-        text = page.extract_text() or ""
-        lines = text.splitlines()
-        found_lines = [l for l in lines if pattern.search(l)]
-        if found_lines:
-            page_numbers.append(page_num + 1)
-print("Page numbers where table caption lines were found:", page_numbers)
+    for caption in result["captions"]:
+        print(f"Page {caption['page']}: {caption['text']}")
+    # print as python list the page numbers where the table caption lines are found
+    print("Page numbers where table caption lines were found:", result["pages"])
+
+def print_timings(result):
+    print("Timing:")
+    for tier, seconds in result["timings"].items():
+        print(f"  {tier}: {seconds:.3f} s")
+
+if __name__ == "__main__":
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    docname = "at90can128_rm.pdf"
+    docname = r"C:\Users\E40065689\Desktop\pdf_parse\at90can128_rm.pdf_chapters\4__Memories.pdf"
+    docname = r"C:\Users\E40065689\Desktop\pdf_parse\at90can128_rm.pdf_chapters\25__Memory_Programming.pdf"
+    #docname = "C:/Users/E40065689/Downloads/LS10xxARM.pdf"
 
+    parser = argparse.ArgumentParser(description="Find table captions and their tables in PDFs")
+    parser.add_argument("files", nargs="*", default=[docname])
+    parser.add_argument("--pattern", default=DEFAULT_CAPTION_PATTERN, help="caption regex (case-insensitive)")
+    parser.add_argument("--prefilter", action="store_true",
+                        help="find candidate pages with pymupdf first, run pdfplumber only on those")
+    parser.add_argument("--prefilter-pattern", default=DEFAULT_PREFILTER_PATTERN)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--map", help="write the caption -> table map of all files to this JSON file")
+    args = parser.parse_args()
+    results = scan_pdfs(args.files, args.pattern, prefilter=args.prefilter, workers=args.workers,
+                        prefilter_pattern=args.prefilter_pattern)
+    for result in results:
+        print_report(result)
+        print_timings(result)
+    if args.map:
+        with open(args.map, "w", encoding="utf-8") as f:
+            json.dump({result["doc"]: result["caption_tables"] for result in results}, f, indent=1, ensure_ascii=False)
@@ -0,0 +1,38 @@
+import os
+from importlib.machinery import SourceFileLoader
+from importlib.util import module_from_spec, spec_from_loader
+import pymupdf as p
+import pytest
+
+# A .pyw script is not importable by name
+loader = SourceFileLoader(
+    "process_pdf_toc_sections_GUI",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "process_pdf_toc_sections_GUI.pyw"))
+sections = module_from_spec(spec_from_loader(loader.name, loader))
+loader.exec_module(sections)
+
+@pytest.fixture
+def off_by_n_pdf(tmp_path):
+    # "2 Regs" is printed two pages after the page its ToC entry points to
+    doc = p.open()
+    texts = [["1 Intro", "Intro text, see 2 Regs later."], ["More intro text."], ["Still intro text."],
+             ["2 Regs", "Register text."], ["3 Timers", "Timer text."]]
+    for page_texts in texts:
+        page = doc.new_page()
+        for i, text in enumerate(page_texts):
+            page.insert_text((72, 80 + 40 * i), text, fontsize=11)
+    doc.set_toc([[1, "1 Intro", 1], [1, "2 Regs", 2], [1, "3 Timers", 5]])
+    path = str(tmp_path / "manual.pdf")
+    doc.save(path)
+    return path
+
+def read_sections(folder):
+    return {name: open(os.path.join(folder, name), encoding="utf-8").read() for name in sorted(os.listdir(folder))}
+
+def test_streaming_matches_batch_on_off_by_n_toc(off_by_n_pdf, tmp_path):
+    sections.process_pdf(off_by_n_pdf, str(tmp_path / "batch"))
+    sections.process_pdf(off_by_n_pdf, str(tmp_path / "streaming"), streaming=True)
+    batch = read_sections(tmp_path / "batch")
+    assert list(batch) == ["01_1 Intro.txt", "02_2 Regs.txt", "03_3 Timers.txt"]
+    assert batch["02_2 Regs.txt"] == "2 Regs\n\nRegister text.\n\n"
+    assert read_sections(tmp_path / "streaming") == batch
@@ -0,0 +1,40 @@
+import pymupdf as p
+import pytest
+from page_cache import PageCache
+from table_extractor_pattern_matching import DEFAULT_CAPTION_PATTERN, scan_pdf
+
+def draw_table(page, x0, y0, rows, cols, tag, cw=80, rh=18):
+    for r in range(rows + 1):
+        page.draw_line((x0, y0 + r * rh), (x0 + cols * cw, y0 + r * rh))
+    for c in range(cols + 1):
+        page.draw_line((x0 + c * cw, y0), (x0 + c * cw, y0 + rows * rh))
+    for r in range(rows):
+        for c in range(cols):
+            page.insert_text((x0 + c * cw + 4, y0 + r * rh + 13), f"{tag}r{r}c{c}", fontsize=9)
+    return y0 + rows * rh
+
+@pytest.fixture
+def tables_pdf(tmp_path):
+    doc = p.open()
+    page = doc.new_page()
+    page.insert_text((72, 80), "Table 2-1. Signature bytes", fontsize=10)
+    y = draw_table(page, 72, 90, 3, 3, "A")
+    page.insert_text((72, y + 60), "Table 2-2. Fuse low byte", fontsize=10)
+    draw_table(page, 72, y + 70, 4, 2, "B")
+    page = doc.new_page()
+    page.insert_text((72, 80), "Table 4-1. Lock bits", fontsize=10)
+    y = draw_table(page, 72, 90, 2, 4, "C")
+    page.insert_text((72, y + 60), "Table 4-2. Boot size", fontsize=10)
+    draw_table(page, 72, y + 70, 2, 2, "D")
+    path = str(tmp_path / "tables.pdf")
+    doc.save(path)
+    return path
+
+def test_caption_boxes_are_cached_per_pattern(tables_pdf, tmp_path):
+    with PageCache(str(tmp_path / "cache.sqlite")) as cache:
+        narrow = scan_pdf(tables_pdf, r"^\s*table\s+\d+-1\..+", cache=cache)
+        assert sorted(narrow["caption_tables"]) == ["Table 2-1", "Table 4-1"]
+        full = scan_pdf(tables_pdf, DEFAULT_CAPTION_PATTERN, cache=cache)
+    assert all(caption["bbox"] is not None for caption in full["captions"])
+    assert sorted(full["caption_tables"]) == ["Table 2-1", "Table 2-2", "Table 4-1", "Table 4-2"]
+    assert full["caption_tables"]["Table 2-2"]["rows"][0] == ["Br0c0", "Br0c1"]